@@ -1,9 +1,81 @@
+import sys
+import time
+import json
 import logging as log
 
 import ROOT
 import numpy as np
 
-from lc2pxx import config, utilities
+from lc2pxx import config, utilities, column_cache
+
+class LoopStats:
+    """Statistics of a loop over an Ntuple, see Ntuple.instrument.
+
+    The time of each loop is split in to the time spent reading entries
+    with GetEntry, and the time spent in the rest of the loop, i.e. the
+    caller's loop body and the iteration overhead. If the reading time
+    dominates, the loop is I/O-bound; deactivating branches, see
+    Ntuple.activate_branches, then helps.
+    """
+    def __init__(self, ntuple):
+        """Initialise a LoopStats for a new loop over ntuple."""
+        self.name = ntuple.GetName()
+        self.active_branches = len(ntuple.active_branches())
+        # Ntuple.cache_stats at the end of the loop
+        self.cache = None
+        # Entries read, and uncompressed bytes read by GetEntry
+        self.entries = 0
+        self.bytes_read = 0
+        # Bytes read from all files, i.e. compressed, by the process
+        self.file_bytes_start = ROOT.TFile.GetFileBytesRead()
+        self.file_bytes_read = 0
+        self.read_seconds = 0.
+        self.body_seconds = 0.
+        self.start = self.returned = time.time()
+        self.total_seconds = 0.
+
+    def read(self, ntuple, entry):
+        """Return ntuple.set_entry(entry), timing it.
+
+        The time since the previous read returned is counted as loop body.
+        """
+        start = time.time()
+        self.body_seconds += start - self.returned
+        nbytes = ntuple.set_entry(entry)
+        self.returned = time.time()
+        self.read_seconds += self.returned - start
+        if nbytes > 0:
+            self.entries += 1
+            self.bytes_read += nbytes
+        return nbytes
+
+    def finish(self, ntuple):
+        """Complete the statistics at the end of the loop over ntuple."""
+        now = time.time()
+        self.body_seconds += now - self.returned
+        self.total_seconds = now - self.start
+        self.file_bytes_read = (
+            ROOT.TFile.GetFileBytesRead() - self.file_bytes_start
+        )
+        self.cache = ntuple.cache_stats()
+
+    def summary(self):
+        """Return a dictionary of the statistics."""
+        return {
+            "ntuple": self.name,
+            "entries": self.entries,
+            "active_branches": self.active_branches,
+            "bytes_read": self.bytes_read,
+            "file_bytes_read": self.file_bytes_read,
+            "read_seconds": self.read_seconds,
+            "body_seconds": self.body_seconds,
+            "total_seconds": self.total_seconds,
+            "cache": self.cache,
+            "entries_per_second": (
+                self.entries/self.total_seconds if self.total_seconds else 0.
+            )
+        }
+
 
 class Ntuple(ROOT.TChain):
     """Wrapper class for TChain.
@@ -15,6 +87,7 @@ class Ntuple(ROOT.TChain):
         for entry in my_ntuple:
             # entry is the current entry number
             ...
+    A loop left early, e.g. with break, is closed with finish_loop.
     Looping can be speeded up with the use of activate_branches.
     """
     # ROOT TBranch types corresponding the numpy types
@@ -43,32 +116,94 @@ class Ntuple(ROOT.TChain):
         super(Ntuple, self).__init__(name)
         # Current entry number
         self.entry = -1
-        # Total number of entries
+        # Position of the current entry among the selected entries
+        self.index = -1
+        # Total number of (selected) entries
         self.entries = 0
         # Dictionary of branch names to array pointers
         # Shorthand access to this is provided by the val method
         self.vars = {}
         # True to show a progress bar when iterating over self
         self.show_progress = True
+        # utilities.ProgressBar of the current loop, updated when index
+        # reaches progress_at
+        self.progress = None
+        self.progress_at = sys.maxint
+        # True to record the statistics of each loop over self in
+        # loop_stats, a LoopStats, logged as JSON at the end of the loop.
+        # Takes effect from the next loop.
+        self.instrument = False
+        self.loop_stats = None
+        # True between the start of a loop and finish_loop
+        self.looping = False
+        # True if the TTreeCaches are to be set up when a loop starts, see
+        # `setup_cache`
+        self.cache_pending = False
 
     def __iter__(self):
         """Ntuple is iterable."""
+        # A previous loop may have been left early
+        self.finish_loop()
+        if self.cache_pending:
+            # Loads the tree of the first entry, which the loop reads first
+            self.LoadTree(max(self.GetEntryNumber(0), 0))
+            self.setup_cache()
         # Reset the current entry
         self.entry = -1
+        self.index = -1
+        if self.show_progress:
+            self.progress = utilities.ProgressBar(self.entries)
+            self.progress_at = self.progress.next_update
+        else:
+            self.progress = None
+            self.progress_at = sys.maxint
+        self.loop_stats = LoopStats(self) if self.instrument else None
+        self.looping = True
         return self
 
     def next(self):
-        """Set current entry to the next, returning the entry number."""
-        self.entry += 1
-        if self.show_progress:
-            utilities.progress_bar(1.*self.entry/self.entries)
-        if self.set_entry(self.entry) <= 0:
-            if self.show_progress:
-                # Newline after the progress bar
-                print ""
+        """Set current entry to the next, returning the entry number.
+
+        Only the selected entries are visited, see `copy_selected`.
+        """
+        self.index += 1
+        # Only an integer comparison per entry between progress updates
+        if self.index >= self.progress_at:
+            self.progress_at = self.progress.update(self.index)
+        # Maps the position to the entry number through the entry list
+        entry = self.GetEntryNumber(self.index)
+        if entry < 0:
+            nbytes = 0
+        elif self.loop_stats is not None:
+            nbytes = self.loop_stats.read(self, entry)
+        else:
+            nbytes = self.set_entry(entry)
+        if nbytes <= 0:
+            self.finish_loop()
             raise StopIteration
         return self.entry
 
+    def finish_loop(self):
+        """Finish the current loop over self, if any.
+
+        Completes the progress bar, and logs the loop statistics if
+        instrumented. Called at the end of a loop, and should be called
+        after leaving a loop early, else this is only done when the next
+        loop starts, or on leaving a `with` block of self.
+        """
+        if not self.looping:
+            return
+        self.looping = False
+        if self.progress is not None:
+            self.progress.finish()
+            self.progress = None
+            self.progress_at = sys.maxint
+        if self.loop_stats is not None:
+            self.loop_stats.finish(self)
+            log.info("Ntuple loop statistics: {0}".format(
+                json.dumps(self.loop_stats.summary(), sort_keys=True)
+            ))
+
     @classmethod
     def from_ntuple(cls, ntuple):
         """Instantiate a new Ntuple from an existing one."""
@@ -88,6 +223,7 @@ class Ntuple(ROOT.TChain):
         ret = self.Add(path)
         self.entries = self.GetEntries()
         self.setup_branches()
+        self.setup_cache()
         return ret
 
     def add_friend(self, tree_name, path="", tree=""):
@@ -98,6 +234,7 @@ class Ntuple(ROOT.TChain):
         elif tree:
             ret = self.AddFriend(tree, tree_name)
         self.setup_branches()
+        self.setup_cache()
         return ret
 
     def val(self, var, reference=False):
@@ -127,6 +264,154 @@ class Ntuple(ROOT.TChain):
             self.SetBranchStatus("*", 0)
         for branch in branches:
             self.SetBranchStatus(branch, 1)
+        # Retrain the cache on the new active branches
+        self.setup_cache()
+
+    def active_branches(self):
+        """Return the list of names of active branches."""
+        return [b for b in self.vars if self.GetBranchStatus(b)]
+
+    def setup_cache(self):
+        """Set up TTreeCaches holding the baskets of the active branches.
+
+        The cache reads the baskets of all cached branches in a few large
+        reads, rather than one small read per basket, which is much faster
+        on network filesystems. Its size is config.tree_cache_size, and
+        the baskets are prefetched asynchronously if
+        config.tree_cache_prefetch is True.
+        The trees of friends have their own caches, of the same size.
+        This is called by `add`, `add_friend` and `activate_branches`, as
+        only the branches active at the time are cached. A cache belongs
+        to the file being read, so if no file has been read yet, the
+        caches are set up when the next loop starts.
+        """
+        size = config.tree_cache_size
+        if not size or not self.GetEntries():
+            return
+        if config.tree_cache_prefetch:
+            ROOT.gEnv.SetValue("TFile.AsyncPrefetching", 1)
+        self.SetCacheSize(size)
+        self.cache_pending = not self.GetCurrentFile()
+        if self.cache_pending:
+            return
+        trees = [self]
+        for friend in self.GetListOfFriends() or []:
+            tree = friend.GetTree()
+            if tree:
+                tree.SetCacheSize(size)
+                trees.append(tree)
+        for tree in trees:
+            tree.DropBranchFromCache("*", True)
+            # All active branches, including those holding arrays
+            for branch in tree.GetListOfBranches():
+                if tree.GetBranchStatus(branch.GetName()):
+                    tree.AddBranchToCache(branch, True)
+            # The branches are known, so skip the cache's learning phase
+            tree.StopCacheLearningPhase()
+
+    def cache_stats(self):
+        """Return a dictionary of statistics of the TTreeCache.
+
+        The efficiency is the fraction of basket reads served by the
+        cache, for the current file. Returns None if there is no cache.
+        """
+        f = self.GetCurrentFile()
+        cache = f.GetCacheRead(self.GetTree()) if f else None
+        if not cache:
+            return None
+        return {
+            "size": cache.GetBufferSize(),
+            "efficiency": cache.GetEfficiency(),
+            "efficiency_rel": cache.GetEfficiencyRel(),
+            "branches": len(cache.GetCachedBranches() or [])
+        }
+
+    def arrays(self, branches, cuts=""):
+        """Return a dictionary of branch names to numpy arrays of values.
+
+        Each branch is read with a single TTree::Draw call, so the values
+        are copied in to the array in one go rather than entry by entry.
+        If config.use_column_cache is True, and there is local scratch,
+        branches of the chain's trees, or of its friends, are instead read
+        from the column cache, see lc2pxx.column_cache. Arrays read in full
+        from a single file are then read-only memory maps.
+        The branches must be active.
+        Keyword arguments:
+        branches -- List of strings of branches (or formulae) to read
+        cuts -- Only read entries passing these requirements (default: "")
+        """
+        # Draw only buffers GetEstimate() entries, so make room for all
+        self.SetEstimate(self.GetEntries() + 1)
+        arrays = {}
+        uncached = []
+        # Chain entry numbers of the entries passing the cuts and selection
+        entries = None
+        for branch in branches:
+            columns = self.cached_columns(branch)
+            if columns is None:
+                uncached.append(branch)
+                continue
+            if len(columns) == 1:
+                values = columns[0]
+            else:
+                values = np.concatenate(columns)
+            if cuts or self.GetEntryList():
+                if entries is None:
+                    entries = self._draw("Entry$", cuts).astype(np.int64)
+                values = values[entries]
+            arrays[branch] = values
+        for branch in uncached:
+            arrays[branch] = self._draw(branch, cuts)
+        return arrays
+
+    def _draw(self, formula, cuts):
+        """Return an array of the values of formula for entries passing cuts.
+
+        The estimate must have been set to hold all entries.
+        """
+        n = self.Draw(formula, cuts, "goff")
+        values = self.GetV1()
+        values.SetSize(n)
+        return np.frombuffer(values, dtype=np.float64).copy()
+
+    def column_sources(self, branch):
+        """Return (file path, tree name) of each tree holding the branch.
+
+        The trees are those of the chain, or of the friend holding the
+        branch. Returns None if there is no such branch, e.g. if branch is
+        a formula.
+        """
+        if self.GetListOfBranches().FindObject(branch):
+            return [(f.GetTitle(), f.GetName()) for f in self.GetListOfFiles()]
+        for friend in self.GetListOfFriends() or []:
+            tree = friend.GetTree()
+            if not tree.GetBranch(branch):
+                continue
+            if isinstance(tree, ROOT.TChain):
+                return [
+                    (f.GetTitle(), f.GetName()) for f in tree.GetListOfFiles()
+                ]
+            return [(tree.GetCurrentFile().GetName(), friend.GetTreeName())]
+        return None
+
+    def cached_columns(self, branch):
+        """Return the cached values of branch, as one array per tree.
+
+        Returns None if the column cache is disabled, or the branch cannot
+        be cached.
+        """
+        if not config.use_column_cache or not config.column_cache_dir:
+            return None
+        sources = self.column_sources(branch)
+        if not sources:
+            return None
+        columns = []
+        for path, tree in sources:
+            values = column_cache.column(path, tree, branch)
+            if values is None:
+                return None
+            columns.append(values)
+        return columns
 
     def setup_branches(self):
         """Populate the vars dict with appropriate-type numpy arrays."""
@@ -159,27 +444,108 @@ class Ntuple(ROOT.TChain):
                 self.vars[name] = z
             self.SetBranchAddress(name, z)
 
+    def dataset_tree(self, branches):
+        """Return a TTree of branches to construct a RooDataSet from.
+
+        RooDataSet reads the trees of the chain directly, ignoring the
+        entry list of a selected Ntuple. If there is one, the branches of
+        the selected entries are copied in to a new TTree held in memory,
+        else self is returned.
+        The copy is made by TTree::CopyTree, in compiled code, if the
+        branches are all in the chain's trees. Branches of friends are
+        instead read with `arrays` and filled entry by entry from Python,
+        which costs about a microsecond per entry.
+        Keyword arguments:
+        branches -- List of strings of branches the dataset needs
+        """
+        if not self.GetEntryList():
+            return self
+        own_branches = self.GetListOfBranches()
+        if all(own_branches.FindObject(b) for b in branches):
+            tree = self._copy_branches(branches)
+        else:
+            tree = self._fill_branches(branches)
+        tree.SetDirectory(0)
+        return tree
+
+    def _copy_branches(self, branches):
+        """Return a TTree of the selected entries of the chain's branches.
+
+        Only the given branches are activated for the copy, the statuses
+        of the chain's branches being restored afterwards.
+        """
+        statuses = dict(
+            (b.GetName(), self.GetBranchStatus(b.GetName()))
+            for b in self.GetListOfBranches()
+        )
+        for name in statuses:
+            self.SetBranchStatus(name, name in branches)
+        # Created in memory, rather than in any file open for writing
+        directory = ROOT.gDirectory.GetPath()
+        ROOT.gROOT.cd()
+        try:
+            # Visits the selected entries only, through the entry list
+            tree = self.CopyTree("")
+        finally:
+            ROOT.TDirectory.Cd(directory)
+            for name, status in statuses.iteritems():
+                self.SetBranchStatus(name, status)
+        # The copy is bound to the buffers in self.vars, see CloneTree
+        tree.ResetBranchAddresses()
+        return tree
+
+    def _fill_branches(self, branches):
+        """Return a TTree of the selected entries of branches, as doubles.
+
+        The tree is filled entry by entry, from the values read by
+        `arrays`.
+        """
+        arrays = self.arrays(branches)
+        tree = ROOT.TTree(self.GetName(), self.GetTitle())
+        tree.SetDirectory(0)
+        # Each branch is bound to one element of a shared buffer
+        values = np.column_stack([arrays[b] for b in branches])
+        buffer = np.zeros(len(branches))
+        for i, branch in enumerate(branches):
+            tree.Branch(branch, buffer[i:i + 1], "{0}/D".format(branch))
+        for row in values:
+            buffer[:] = row
+            tree.Fill()
+        return tree
+
     def copy_selected(self, cuts):
         """Return a new Ntuple instance containing only the entries
         passing the requirements in cuts.
 
-        Creates a temporary file in which the copied tree resides,
-        containing only branches which are activated in `self`.
+        No data are copied: the new instance chains the same files, and
+        the selected entries are held in a TEntryList set on it, which
+        iteration, Draw, arrays, and dataset_tree respect.
+        Branch statuses are copied from `self`. Selecting from a selected
+        Ntuple gives the entries passing both selections.
         """
-        temp_file = utilities.create_temp_file()
-        temp_file_path = temp_file.GetEndpointUrl().GetFile()
-        # Copied tree exists in temp_file
-        sel_tree = self.CopyTree(cuts)
-        sel_tree.Write()
+        name = "{0}_selection".format(self.GetName())
+        self.Draw(">>{0}".format(name), cuts, "entrylist")
+        entry_list = ROOT.gDirectory.Get(name)
+        # Keep the list out of any open file, so it's not written to it
+        entry_list.SetDirectory(0)
         # Create a new instance of the class of the current object.
         # If the caller is a child class of Ntuple, this will
         # create a new instance of that child class
         sel_ntuple = self.__class__.from_ntuple(self)
-        sel_ntuple.SetName(sel_tree.GetName())
-        sel_ntuple.SetTitle(sel_tree.GetTitle())
-        # If we closed this earlier, sel_tree would've been deleted
-        temp_file.Close()
-        sel_ntuple.add(temp_file_path)
+        sel_ntuple.SetTitle(self.GetTitle())
+        for f in self.GetListOfFiles():
+            sel_ntuple.add(f.GetTitle())
+        for branch in self.vars:
+            if branch in sel_ntuple.vars:
+                sel_ntuple.SetBranchStatus(
+                    branch, self.GetBranchStatus(branch)
+                )
+        sel_ntuple.setup_cache()
+        sel_ntuple.SetEntryList(entry_list)
+        sel_ntuple.entries = entry_list.GetN()
+        log.info("Selected {0} of {1} entries".format(
+            sel_ntuple.entries, self.GetEntries()
+        ))
         return sel_ntuple
 
     def __enter__(self):
@@ -187,5 +553,7 @@ class Ntuple(ROOT.TChain):
         return self
 
     def __exit__(self, type, value, traceback):
-        """Deletes the file on disk belonging to this ntuple."""
-        utilities.delete_temp_file(self.GetFile())
+        """Releases the selection of a selected Ntuple."""
+        self.finish_loop()
+        self.SetEntryList(0)
+        self.entries = self.GetEntries()
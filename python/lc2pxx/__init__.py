@@ -12,6 +12,9 @@ __all__ = [
     "Lc2pXX",
     "ntuples",
     "utilities",
+    "scratch",
+    "staging",
+    "column_cache",
     "containers",
     "plotting",
     "fitting",
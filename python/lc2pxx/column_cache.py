@@ -0,0 +1,203 @@
+"""
+column_cache
+Branches of ROOT files decompressed once in to memory-mappable .npy files.
+
+Reading a branch with TTree::Draw decompresses all its baskets, every time.
+`column` instead reads a branch of a tree once, saves its values as a .npy
+file in config.column_cache_dir, and on later reads returns them as a
+read-only memory-mapped array, so that repeated reads are bounded by the
+speed of the page cache rather than that of decompression.
+
+The columns of each tree are kept in a directory per (file, tree), holding
+the size and modification time of the file when the columns were read. If
+either changes, the directory is cleared. The total size of the cache is
+kept below config.column_cache_quota by clearing the least recently used
+directories first. Jobs sharing the cache hold a shared lock on the lock
+file of a directory, next to it, while using it, and an exclusive one
+while clearing it, so directories in use are never cleared.
+Values are stored as float64, as returned by Ntuple.arrays.
+The cache is only used on local scratch, see config.column_cache_dir.
+"""
+
+import os
+import re
+import json
+import fcntl
+import shutil
+import hashlib
+import logging as log
+
+import numpy as np
+
+from lc2pxx import config, utilities
+
+# Name of the file describing the source of the columns in a directory
+source_name = "source.json"
+# Name of the lock file of the cache, taken while evicting
+lock_name = ".lock"
+
+
+def _write_atomic(path, write):
+    """Call write(f) on a temporary file, then rename it to path.
+
+    Concurrent readers never see a partially written file.
+    """
+    partial = "{0}.{1}.partial".format(path, os.getpid())
+    with open(partial, "wb") as f:
+        write(f)
+    os.rename(partial, path)
+
+
+def _key(path, tree):
+    """Return the name of the directory of the columns of tree in path."""
+    return hashlib.sha1("{0}:{1}".format(path, tree)).hexdigest()
+
+
+def lock_path(path, tree):
+    """Return the path to the lock file of the columns of tree in path."""
+    path = os.path.abspath(path)
+    return os.path.join(
+        config.column_cache_dir, "{0}.lock".format(_key(path, tree))
+    )
+
+
+def _is_source(source_path, source):
+    """Return True if the file at source_path describes source."""
+    try:
+        with open(source_path) as f:
+            return json.load(f) == source
+    except (IOError, ValueError):
+        return False
+
+
+def cache_dir(path, tree, lock):
+    """Return the directory of the cached columns of tree in the file.
+
+    The directory is created, or cleared if the file has changed since
+    the columns were cached. A shared lock is then held on lock, the open
+    file at `lock_path`, until it is closed, so that no job clears the
+    directory while it is used.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    source = {
+        "path": path,
+        "tree": tree,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime
+    }
+    directory = os.path.join(config.column_cache_dir, _key(path, tree))
+    source_path = os.path.join(directory, source_name)
+    fcntl.flock(lock, fcntl.LOCK_SH)
+    # Checked again after each change of lock, which is not atomic
+    while not _is_source(source_path, source):
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not _is_source(source_path, source):
+            if os.path.isdir(directory):
+                log.info("Clearing column cache of `{0}`".format(path))
+                shutil.rmtree(directory, ignore_errors=True)
+            utilities.make_dirs(directory)
+            _write_atomic(source_path, lambda f: json.dump(source, f))
+        fcntl.flock(lock, fcntl.LOCK_SH)
+    return directory
+
+
+def read_branch(path, tree, branch):
+    """Return an array of the values of branch, read with TTree::Draw.
+
+    Returns None if the branch does not have one value per entry, i.e. if
+    its leaf is an array, of fixed or variable size.
+    """
+    import ROOT
+    f = ROOT.TFile(path)
+    t = f.Get(tree)
+    leaf = t.GetLeaf(branch)
+    if not leaf or leaf.GetLeafCount() or leaf.GetLenStatic() != 1:
+        f.Close()
+        return None
+    t.SetEstimate(t.GetEntries() + 1)
+    n = t.Draw(branch, "", "goff")
+    if n == 0:
+        values = np.zeros(0)
+    else:
+        buffer = t.GetV1()
+        buffer.SetSize(n)
+        values = np.frombuffer(buffer, dtype=np.float64).copy()
+    f.Close()
+    return values
+
+
+def evict(size):
+    """Clear the least recently used directories to make room for size.
+
+    The last use of a directory is the modification time of its lock file,
+    see `column`. Directories in use by any job are skipped.
+    """
+    quota = config.column_cache_quota
+    if quota is None:
+        return
+    cache = config.column_cache_dir
+    with open(os.path.join(cache, lock_name), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        directories = []
+        for name in os.listdir(cache):
+            directory = os.path.join(cache, name)
+            if not os.path.isdir(directory):
+                continue
+            try:
+                last_use = os.path.getmtime(directory + ".lock")
+                used = sum(
+                    os.path.getsize(os.path.join(directory, f))
+                    for f in os.listdir(directory)
+                )
+            except OSError:
+                # Cleared by another job meanwhile
+                continue
+            directories.append((last_use, used, directory))
+        directories.sort()
+        used = sum(u for t, u, d in directories)
+        for last_use, directory_used, directory in directories:
+            if used + size <= quota:
+                break
+            with open(directory + ".lock", "a") as directory_lock:
+                if not utilities.try_flock(directory_lock, fcntl.LOCK_EX):
+                    continue
+                log.info("Clearing column cache `{0}`".format(directory))
+                shutil.rmtree(directory, ignore_errors=True)
+            used -= directory_used
+        if used + size > quota:
+            log.warning("Column cache over quota, columns are in use")
+
+
+def column(path, tree, branch):
+    """Return the values of branch in tree in the file at path.
+
+    The values are read, and cached, on first use, and are returned as a
+    read-only memory-mapped array. Returns None if the branch cannot be
+    cached, see `read_branch`.
+    """
+    utilities.make_dirs(config.column_cache_dir)
+    with open(lock_path(path, tree), "a") as lock:
+        directory = cache_dir(path, tree, lock)
+        # Records the last use of the directory, for the LRU eviction
+        os.utime(lock.name, None)
+        name = re.sub(r"[^\w.]", "_", branch)
+        column_path = os.path.join(directory, "{0}.npy".format(name))
+        # Marks branches found not to be cacheable, so they're not read
+        # again
+        uncacheable_path = os.path.join(
+            directory, "{0}.uncacheable".format(name)
+        )
+        if os.path.exists(uncacheable_path):
+            return None
+        if not os.path.exists(column_path):
+            log.info("Caching column {0} of `{1}`".format(branch, path))
+            values = read_branch(path, tree, branch)
+            if values is None:
+                _write_atomic(uncacheable_path, lambda f: None)
+                return None
+            evict(values.nbytes)
+            _write_atomic(column_path, lambda f: np.save(f, values))
+        # The mapping stays valid after the lock is released, even if the
+        # file is then deleted
+        return np.load(column_path, mmap_mode="r")
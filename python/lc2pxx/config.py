@@ -7,6 +7,9 @@ verbose, but I think it's worthwhile trade-off.
 """
 
 import os
+import sys
+import types
+import logging as log
 
 from lc2pxx.utilities import file_exists
 
@@ -117,13 +120,88 @@ stripping_years = {
 # else use DLL
 use_probnn = True
 
+# Fit execution options, see fitting.lambdac_mass.fit_options
+# Number of processes evaluating the likelihood, or None to choose it
+# from the number of cores and the number of entries being fitted
+fit_num_cpu = None
+# Minimum number of entries per likelihood process when choosing fit_num_cpu
+fit_entries_per_cpu = 20000
+# Use vectorised (batch) PDF evaluation, if the ROOT version supports it
+fit_batch_mode = False
+# MINUIT strategy, 0 (fewest calls) to 2 (most careful)
+fit_strategy = 1
+# Offset the likelihood by its initial value, for precision in large samples
+fit_offset = False
+
 # Important paths
-_home_dir = _get_environment_var("AFS")
-_work_dir = _get_environment_var("WORK")
-_scratch_dir = _get_environment_var("SCRATCH")
-work_data_dir = _work_dir + "/Lc2pXX"
-scratch_data_dir = _scratch_dir + "/Lc2pXX"
 project_dir = os.getcwd()
 output_dir = project_dir + "/output"
+# Converged fit parameters used to warm-start fits, see fitting.seeds
+fit_seeds_path = output_dir + "/fits/seeds.json"
+# Maximum total size of temporary files in bytes, None for no limit,
+# see lc2pxx.scratch
+scratch_quota = None
+# Size of the TTreeCache of each Ntuple in bytes, 0 to disable it
+tree_cache_size = 30*1024*1024
+# Prefetch the cached baskets asynchronously, in a separate thread
+tree_cache_prefetch = False
+# Copy ntuples from the work area to local scratch on first use, see
+# lc2pxx.staging
+use_staging = True
+# Maximum total size of the staged ntuples in bytes
+staging_quota = 100*1024**3
+# Read branches through the cache of decompressed columns, see
+# lc2pxx.column_cache, if there is local scratch
+use_column_cache = True
+# Maximum total size of the cached columns in bytes, None for no limit
+column_cache_quota = 20*1024**3
+
+
+def _data_dir(parent, name):
+    """Return parent/name, or None if the parent directory is None."""
+    return None if parent is None else "{0}/{1}".format(parent, name)
+
+# Attributes depending on the environment, and on the filesystem, are
+# computed on first access, by these functions of the config module,
+# rather than on import
+_lazy_attributes = {
+    "_home_dir": lambda c: _get_environment_var("AFS"),
+    "_work_dir": lambda c: _get_environment_var("WORK"),
+    "_scratch_dir": lambda c: _get_environment_var("SCRATCH"),
+    "work_data_dir": lambda c: _data_dir(c._work_dir, "Lc2pXX"),
+    "scratch_data_dir": lambda c: _data_dir(c._scratch_dir, "Lc2pXX"),
+    # PIDCalib performance histograms, created by scripts/PIDCalib
+    "pidcalib_dir": lambda c: _data_dir(c.work_data_dir, "PIDCalib"),
+    "use_scratch": lambda c: (
+        c.scratch_data_dir is not None and file_exists(c.scratch_data_dir)
+    ),
+    # Staged copies of ntuples, only if there is local scratch
+    "staging_dir": lambda c: (
+        _data_dir(c.scratch_data_dir, "staged") if c.use_scratch else None
+    ),
+    # Cached columns, only if there is local scratch
+    "column_cache_dir": lambda c: (
+        _data_dir(c.scratch_data_dir, "columns") if c.use_scratch else None
+    )
+}
+
+
+class _Config(types.ModuleType):
+    """The config module, computing `_lazy_attributes` on first access."""
+    def __getattr__(self, name):
+        # Only called if the attribute has not been set
+        try:
+            compute = _lazy_attributes[name]
+        except KeyError:
+            raise AttributeError(name)
+        value = compute(self)
+        setattr(self, name, value)
+        return value
 
-use_scratch = file_exists(scratch_data_dir)
+# Replace this module by a _Config instance with the same attributes.
+# A reference to the original is kept, as the globals of a module are
+# cleared when it is deleted.
+_config = _Config(__name__, __doc__)
+_config.__dict__.update(globals())
+_config._module = sys.modules[__name__]
+sys.modules[__name__] = _config
@@ -1,148 +1,270 @@
+import logging as log
+from math import sqrt
+
+import numpy as np
 from uncertainties import ufloat
 
-from lc2pxx import config
+from lc2pxx import config, utilities
+from lc2pxx.efficiencies import tables
 
-def efficiency(mode, polarity, year):
-    """Return the PID efficiency from PIDCalib.
+# PIDCalib binning of the performance histograms, as defined in
+# scripts/PIDCalib/Lc2pXX_binning.py
+# Momentum in MeV, with boundaries at the RICH K+/K- thresholds
+pidcalib_p_bins = np.concatenate((
+    [5e3, 9.3e3, 15.6e3], np.linspace(19e3, 100e3, 16)
+))
+pidcalib_eta_bins = np.linspace(2., 4.5, 5)
+pidcalib_ntracks_bins = np.array([0., 50., 200., 300., 500.])
 
-    Instructions on how we run PIDCalib.
-    """
-    # With mcMatch ntuple
-    efficiencies_2011_20r1_ProbNN = {
-        config.pKpi: {
-            config.magup: ufloat(0.40271, 0.00013),
-            config.magdown: ufloat(0.40824, 0.00011)
-        },
-        config.pKK: {
-            config.magup: ufloat(0.35087, 0.00007),
-            config.magdown: ufloat(0.35466, 0.00006)
-        },
-        config.ppipi: {
-            config.magup: ufloat(0.46807, 0.00010),
-            config.magdown: ufloat(0.47014, 0.00009)
-        },
-        config.pphi: {
-            config.magup: ufloat(0.34985, 0.00012),
-            config.magdown: ufloat(0.35816, 0.00010)
-        }
-    }
-    # Without mcMatch ntuple
-    # efficiencies_2011_20r1 = {
-    #     config.pKpi: {
-    #         config.magup: ufloat(0.41808, 0.00012),
-    #         config.magdown: ufloat(0.42376, 0.00010)
-    #     },
-    #     config.pKK: {
-    #         config.magup: ufloat(0.36190, 0.00007),
-    #         config.magdown: ufloat(0.36487, 0.00006)
-    #     },
-    #     config.ppipi: {
-    #         config.magup: ufloat(0.48830, 0.00009),
-    #         config.magdown: ufloat(0.48895, 0.00008)
-    #     },
-    #     config.pphi: {
-    #         config.magup: ufloat(0.35987, 0.00012),
-    #         config.magdown: ufloat(0.36749, 0.00010)
-    #     }
-    # }
-    # With mcMatch, DLL cuts
-    efficiencies_2011_20r1_DLL = {
-        config.pKpi: {
-            config.magup: ufloat(0.46264, 0.00015),
-            config.magdown: ufloat(0.47012, 0.00013)
-        },
-        config.pKK: {
-            config.magup: ufloat(0.42660, 0.00009),
-            config.magdown: ufloat(0.43028, 0.00007)
-        },
-        config.ppipi: {
-            config.magup: ufloat(0.44364, 0.00010),
-            config.magdown: ufloat(0.44174, 0.00008)
-        },
-        config.pphi: {
-            config.magup: ufloat(0.43657, 0.00015),
-            config.magdown: ufloat(0.44379, 0.00012)
-        }
-    }
-    # Stripping 17b with reco MC ntuple
-    efficiencies_2011_17b_ProbNN = {
-        config.pKpi: {
-            config.magup: ufloat(0.38016, 0.00006),
-            config.magdown: ufloat(0.38131, 0.00008)
-        },
-        config.pKK: {
-            config.magup: ufloat(0.35378, 0.00012),
-            config.magdown: ufloat(0.35893, 0.00017)
-        },
-        config.ppipi: {
-            config.magup: ufloat(0.39228, 0.00014),
-            config.magdown: ufloat(0.39182, 0.00015)
-        },
-        config.pphi: {
-            config.magup: ufloat(0.35814, 0.00020),
-            config.magdown: ufloat(0.36267, 0.00023)
-        }
-    }
-    # Stripping 17b with reco MC ntuple DLL
-    efficiencies_2011_17b_DLL = {
-        config.pKpi: {
-            config.magup: ufloat(0.48685, 0.00007),
-            config.magdown: ufloat(0.49165, 0.00009)
-        },
-        config.pKK: {
-            config.magup: ufloat(0.44684, 0.00014),
-            config.magdown: ufloat(0.45158, 0.00018)
-        },
-        config.ppipi: {
-            config.magup: ufloat(0.44826, 0.00015),
-            config.magdown: ufloat(0.44894, 0.00018)
-        },
-        config.pphi: {
-            config.magup: ufloat(0.46216, 0.00023),
-            config.magdown: ufloat(0.46538, 0.00029)
-        }
+# PIDCalib stripping names of the performance histograms
+pidcalib_strippings = {
+    "20r1": "20r1_MCTuneV2",
+    "17b": "17"
+}
+
+# PID cuts of the performance histograms per PID scheme, as in
+# scripts/PIDCalib/run_multitrackcalib_*.sh
+pidcalib_cuts = {
+    "ProbNN": {
+        "P": "ProbNNp > 0.5 && PIDp > 4 && PIDpK > 0",
+        "K": "ProbNNK > 0.5 && DLLK > 4",
+        "Pi": "ProbNNpi > 0.7 && DLLK < 10",
+        # ppipi pion cut is tighter than pKpi
+        "Pi_ppipi": "ProbNNpi > 0.7 && DLLK < 4"
+    },
+    "DLL": {
+        "P": "DLLp > 20 && DLLpK > 9",
+        "K": "DLLK > 10",
+        "Pi": "DLLK < 10",
+        "Pi_ppipi": "DLLK < 0"
     }
+}
 
-    if config.use_probnn:
-        efficiencies_2011_17b = efficiences_2011_17b_ProbNN
-        efficiencies_2011_20r1 = efficiences_2011_20r1_ProbNN
-    else:
-        efficiencies_2011_17b = efficiences_2011_17b_DLL
-        efficiencies_2011_20r1 = efficiences_2011_20r1_DLL
-
-    if config.stripping_years[2011] is "17b":
-        efficiencies_2011 = efficiencies_2011_17b
-    else:
-        efficiencies_2011 = efficiencies_2011_20r1
-
-    efficiencies_2012 = {
-        config.pKpi: {
-            config.magup: ufloat(1.0, 1.0),
-            config.magdown: ufloat(1.0, 1.0)
-        },
-        config.pKK: {
-            config.magup: ufloat(1.0, 1.0),
-            config.magdown: ufloat(1.0, 1.0)
-        },
-        config.ppipi: {
-            config.magup: ufloat(1.0, 1.0),
-            config.magdown: ufloat(1.0, 1.0)
-        }
+# Maps the ntuple branches for each mode to the PIDCalib particle name,
+# and to the pidcalib_cuts key of the cut on that branch
+pidcalib_tracks = {
+    config.pKpi: {
+        "proton": ("P", "P"),
+        "h1": ("K", "K"),
+        "h2": ("Pi", "Pi")
+    },
+    config.pKK: {
+        "proton": ("P", "P"),
+        "h1": ("K", "K"),
+        "h2": ("K", "K")
+    },
+    config.ppipi: {
+        "proton": ("P", "P"),
+        "h1": ("Pi", "Pi_ppipi"),
+        "h2": ("Pi", "Pi_ppipi")
     }
+}
+pidcalib_tracks[config.pphi] = pidcalib_tracks[config.pKK]
 
-    efficiencies_2012[config.pphi] = efficiencies_2012[config.pKK]
+# Loaded PIDCalibTable objects, keyed by `perf_hists_path` and cut
+_pidcalib_tables = {}
 
-    efficiencies = {
-        2011: efficiencies_2011,
-        2012: efficiencies_2012
-    }
 
-    # Add the MagBoth key as the average of up and down
-    for y in config.years:
-        for m in config.modes:
-            effs = efficiencies[y][m]
-            up = effs[config.magup]
-            down = effs[config.magdown]
-            effs[config.magboth] = (up + down)/2
+class PIDCalibTable:
+    """PIDCalib efficiencies of a PID cut, binned in P, ETA and nTracks.
+
+    The efficiencies and their errors are numpy arrays of shape
+    (P bins, ETA bins, nTracks bins), so that the efficiencies of many
+    tracks can be looked up at once with `bins`.
+    """
+    def __init__(self, edges, efficiencies, errors):
+        """Initialise a PIDCalibTable.
+
+        Keyword arguments:
+        edges -- List of the P, ETA, and nTracks bin edges arrays
+        efficiencies -- Array of efficiencies per bin
+        errors -- Array of efficiency errors per bin
+        """
+        self.edges = edges
+        self.efficiencies = efficiencies
+        self.errors = errors
+
+    @classmethod
+    def from_histogram(cls, h):
+        """Instantiate a new PIDCalibTable from a PIDCalib TH3."""
+        axes = (h.GetXaxis(), h.GetYaxis(), h.GetZaxis())
+        edges = [
+            np.array([a.GetBinLowEdge(i) for i in range(1, a.GetNbins() + 2)])
+            for a in axes
+        ]
+        shape = tuple(len(e) - 1 for e in edges)
+        efficiencies = np.empty(shape)
+        errors = np.empty(shape)
+        for i, j, k in np.ndindex(*shape):
+            efficiencies[i, j, k] = h.GetBinContent(i + 1, j + 1, k + 1)
+            errors[i, j, k] = h.GetBinError(i + 1, j + 1, k + 1)
+        expected = (pidcalib_p_bins, pidcalib_eta_bins, pidcalib_ntracks_bins)
+        for name, e, expected_e in zip(("P", "ETA", "nTracks"), edges,
+                                       expected):
+            if len(e) != len(expected_e) or not np.allclose(e, expected_e):
+                log.warning("{0} binning of {1} differs from {2}".format(
+                    name, h.GetName(), "Lc2pXX_binning.py"
+                ))
+        return cls(edges, efficiencies, errors)
+
+    def bins(self, p, eta, ntracks):
+        """Return the flat bin index of each track, -1 if outside binning.
+
+        Keyword arguments:
+        p, eta, ntracks -- Arrays of the momentum, pseudorapidity, and
+            event track multiplicity of each track
+        """
+        shape = self.efficiencies.shape
+        indices = [
+            np.searchsorted(e, values, side="right") - 1
+            for e, values in zip(self.edges, (p, eta, ntracks))
+        ]
+        valid = np.ones(len(indices[0]), dtype=bool)
+        for index, n in zip(indices, shape):
+            valid &= (index >= 0) & (index < n)
+        flat = np.ravel_multi_index(
+            [np.clip(index, 0, n - 1) for index, n in zip(indices, shape)],
+            shape
+        )
+        flat[~valid] = -1
+        return flat
+
+
+def perf_hists_path(particle, polarity, year, scheme):
+    """Return the path to the PIDCalib performance histograms file.
+
+    The histograms of each stripping are in their own directory, as in
+    scripts/PIDCalib/run_multitrackcalib_*.sh.
+    """
+    stripping = pidcalib_strippings[config.stripping_years[year]]
+    return "{0}/output_{1}/{2}/PerfHists_{3}_Strip{2}_{4}_3D.root".format(
+        config.pidcalib_dir, scheme, stripping, particle, polarity
+    )
 
-    return efficiencies[year][mode][polarity]
+
+def pidcalib_table(particle, cut, polarity, year, scheme):
+    """Return the PIDCalibTable of the particle and cut, loading it once."""
+    path = perf_hists_path(particle, polarity, year, scheme)
+    key = (path, cut)
+    try:
+        return _pidcalib_tables[key]
+    except KeyError:
+        pass
+    if not utilities.file_exists(path):
+        log.error("PIDCalib histograms not found at `{0}`".format(path))
+        raise IOError(path)
+    # ROOT is imported only where needed, so that the tabulated
+    # efficiencies can be used without it
+    import ROOT
+    f = ROOT.TFile(path)
+    name = "{0}_{1}_All".format(particle, cut)
+    h = f.Get(name)
+    if not h:
+        log.error("Histogram `{0}` not found in `{1}`".format(name, path))
+        raise KeyError(name)
+    table = _pidcalib_tables[key] = PIDCalibTable.from_histogram(h)
+    f.Close()
+    return table
+
+
+def weighted_efficiency(tracks, ntracks, weights):
+    """Return the weighted mean of the product of per-track efficiencies.
+
+    Each candidate's efficiency is the product of the efficiencies of its
+    tracks, looked up in the PIDCalib tables. The returned ufloat is the
+    mean of these, weighted by e.g. sWeights, and its error is propagated
+    from the errors of the table bins, bins shared by several tracks
+    being fully correlated. Candidates with a track outside the binning
+    are excluded.
+    Keyword arguments:
+    tracks -- List of (PIDCalibTable, momenta, pseudorapidities) tuples,
+        one per track, with arrays of one value per candidate
+    ntracks -- Array of the event track multiplicity of each candidate
+    weights -- Array of the weight of each candidate
+    """
+    bins = [table.bins(p, eta, ntracks) for table, p, eta in tracks]
+    valid = np.all([b >= 0 for b in bins], axis=0)
+    excluded = weights[~valid].sum()
+    if excluded:
+        log.warning("Excluding {0:.1f}% of weight outside binning".format(
+            100.*excluded/weights.sum()
+        ))
+    weights = weights[valid]
+    bins = [b[valid] for b in bins]
+    total_weight = weights.sum()
+    effs = [
+        table.efficiencies.ravel()[b]
+        for (table, p, eta), b in zip(tracks, bins)
+    ]
+    eff = np.dot(weights, np.prod(effs, axis=0))/total_weight
+
+    # Derivative of eff with respect to each bin of each table
+    derivatives = {}
+    for i, ((table, p, eta), b) in enumerate(zip(tracks, bins)):
+        others = np.prod(effs[:i] + effs[i + 1:], axis=0)
+        d = np.bincount(
+            b, weights=weights*others, minlength=table.efficiencies.size
+        )/total_weight
+        derivatives[table] = derivatives.get(table, 0.) + d
+    variance = sum(
+        np.sum((d*table.errors.ravel())**2)
+        for table, d in derivatives.iteritems()
+    )
+    return ufloat(eff, sqrt(variance))
+
+
+def efficiency_pidcalib(mode, polarity, year, scheme=None):
+    """Return the PID efficiency from per-event PIDCalib efficiencies.
+
+    Each signal candidate's efficiency is the product of the proton, h1,
+    and h2 efficiencies in the PIDCalib P-ETA-nTracks performance
+    histograms, created by scripts/PIDCalib. The mode efficiency is the
+    sWeighted mean over the selected candidates.
+    The Combined polarity is the average of MagUp and MagDown.
+    Keyword arguments:
+    scheme -- PID scheme, "ProbNN" or "DLL" (default: the one chosen by
+        config.use_probnn)
+    """
+    if scheme is None:
+        scheme = tables.pid_scheme()
+    if polarity == config.magboth:
+        up = efficiency_pidcalib(mode, config.magup, year, scheme)
+        down = efficiency_pidcalib(mode, config.magdown, year, scheme)
+        return (up + down)/2
+
+    from lc2pxx import ntuples
+    track_types = pidcalib_tracks[mode]
+    ntuple = ntuples.get_selected(mode, polarity, year)
+    ntuples.add_metatree(ntuple)
+    branches = ["nTracks", "signal_sw"]
+    for track in track_types:
+        branches += ["{0}_P".format(track), "{0}_ETA".format(track)]
+    arrays = ntuple.arrays(branches)
+
+    tracks = []
+    for track, (particle, cut) in sorted(track_types.items()):
+        table = pidcalib_table(
+            particle, pidcalib_cuts[scheme][cut], polarity, year, scheme
+        )
+        tracks.append((
+            table,
+            arrays["{0}_P".format(track)],
+            arrays["{0}_ETA".format(track)]
+        ))
+    return weighted_efficiency(
+        tracks, arrays["nTracks"], arrays["signal_sw"]
+    )
+
+
+def efficiency(mode, polarity, year):
+    """Return the PID efficiency from PIDCalib.
+
+    Instructions on how we run PIDCalib.
+    The efficiencies, for the PID scheme chosen by config.use_probnn, are
+    tabulated in tables.txt, see lc2pxx.efficiencies.tables.
+    See `efficiency_pidcalib` to compute them from the PIDCalib
+    performance histograms.
+    """
+    return tables.lookup(
+        "pid", mode, polarity, year, scheme=tables.pid_scheme()
+    )
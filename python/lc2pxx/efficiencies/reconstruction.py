@@ -1,6 +1,7 @@
 from uncertainties import ufloat
 
 from lc2pxx import config, ntuples, utilities
+from lc2pxx.efficiencies import tables
 
 def efficiency(mode, polarity, year):
     """Return the efficiency of the reconstruction algorithm.
@@ -39,45 +40,9 @@ def efficiency_from_bk(mode, polarity, year):
     This method is here as a placeholder until I fix the MC options, as
     they are not currently selecting all generated decays.
     """
-    bk_numbers = {
-        2011: {
-            config.pKpi: {
-                config.magup: 1007497,
-                config.magdown: 1017497
-            },
-            config.pKK: {
-                config.magup: 1002245,
-                config.magdown: 1013743
-            },
-            config.ppipi: {
-                config.magup: 1015499,
-                config.magdown: 1018996
-            }
-        },
-        2012: {
-            config.pKpi: {
-                config.magup: 0,
-                config.magdown: 0
-            },
-            config.pKK: {
-                config.magup: 0,
-                config.magdown: 0
-            },
-            config.ppipi: {
-                config.magup: 0,
-                config.magdown: 0
-            }
-        }
-    }
-
-    for y in bk_numbers:
-        for m in bk_numbers[y]:
-            effs = bk_numbers[y][m]
-            up = effs[config.magup]
-            down = effs[config.magdown]
-            bk_numbers[y][m][config.magboth] = up + down
-
-    acc_num = bk_numbers[year][mode][polarity]
+    acc_num = int(tables.lookup(
+        "bk_generated", mode, polarity, year
+    ).nominal_value)
     truth = "Lambdac_BKGCAT < 20 && Lambdab_BKGCAT < 60"
     reco_ntuple = ntuples.get_ntuple(
         mode, polarity, year, mc=True, mc_type=config.mc_cheated
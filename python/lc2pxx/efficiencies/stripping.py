@@ -1,6 +1,7 @@
 from uncertainties import ufloat
 
 from lc2pxx import config, ntuples, utilities
+from lc2pxx.efficiencies import tables
 
 def efficiency(mode, polarity, year):
     """Return the stripping efficiency.
@@ -35,45 +36,9 @@ def efficiency_wrt_acceptance(mode, polarity, year):
     This is then similar to `efficiency`, but with respect to the number
     of generated signal decays, obtained from the bookkeeping.
     """
-    bk_numbers = {
-        2011: {
-            config.pKpi: {
-                config.magup: 1007497,
-                config.magdown: 1017497
-            },
-            config.pKK: {
-                config.magup: 1002245,
-                config.magdown: 1013743
-            },
-            config.ppipi: {
-                config.magup: 1015499,
-                config.magdown: 1018996
-            }
-        },
-        2012: {
-            config.pKpi: {
-                config.magup: 0,
-                config.magdown: 0
-            },
-            config.pKK: {
-                config.magup: 0,
-                config.magdown: 0
-            },
-            config.ppipi: {
-                config.magup: 0,
-                config.magdown: 0
-            }
-        }
-    }
-
-    for y in bk_numbers:
-        for m in bk_numbers[y]:
-            effs = bk_numbers[y][m]
-            up = effs[config.magup]
-            down = effs[config.magdown]
-            bk_numbers[y][m][config.magboth] = up + down
-
-    num_accepted = bk_numbers[year][mode][polarity]
+    num_accepted = int(tables.lookup(
+        "bk_generated", mode, polarity, year
+    ).nominal_value)
 
     truth_matching = "Lambdab_BKGCAT < 60 && Lambdac_BKGCAT < 20"
     stripped_ntuple = ntuples.get_ntuple(
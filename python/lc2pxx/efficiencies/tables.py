@@ -0,0 +1,159 @@
+"""
+tables
+Tabulated efficiencies and event counts, loaded once from a text file.
+
+Some efficiencies cannot be calculated from ntuples, such as the generator
+level efficiencies from the Gauss logs, or the PIDCalib results, and the
+bookkeeping event counts are only known from the Dirac bookkeeping. These
+are kept in a table file rather than in dictionaries rebuilt on each call.
+
+Each line of the table file holds one number, keyed by the efficiency type,
+the stripping version, the mode, the magnet polarity, and the PID scheme
+("-" if the number does not depend on it), e.g.
+
+    # type      stripping  modes     polarity  scheme  value
+    acceptance  20r1       pKK,pphi  MagUp     -       0.1946+/-0.000498
+
+Modes separated by commas share the same number, and so are fully
+correlated. Values are in any form accepted by
+uncertainties.ufloat_fromstr; event counts are given with a zero error.
+The first line that is not a comment must state the version of the
+format, e.g. `version 1`.
+The Combined polarity is derived from MagUp and MagDown on first use,
+and cached.
+"""
+
+import os
+import logging as log
+
+from uncertainties import parse_numbers_with_uncert, Variable
+
+from lc2pxx import config
+
+# Version of the table file format read by EfficiencyStore
+format_version = 1
+
+# Table file shipped with the package
+default_path = os.path.join(os.path.dirname(__file__), "tables.txt")
+
+# Functions deriving the Combined polarity from (MagUp, MagDown), per
+# type of number. Efficiencies not listed here are averaged.
+polarity_combinations = {
+    "bk_generated": lambda up, down: up + down
+}
+
+
+class EfficiencyStore:
+    """Tabulated numbers with uncertainties, keyed by
+    (type, stripping, mode, polarity, PID scheme).
+
+    Each tabulated number is a single ufloat, so that numbers returned by
+    different lookups of the same key are correlated.
+    """
+    def __init__(self, path=default_path):
+        """Initialise an EfficiencyStore, loading the table file at path.
+
+        Keyword arguments:
+        path -- Path to the table file (default: the package's tables.txt)
+        """
+        self.path = path
+        self.entries = {}
+        log.info("Loading efficiency tables from {0}".format(path))
+        with open(path) as f:
+            self._load(f)
+
+    @staticmethod
+    def key(type, stripping, mode, polarity, scheme=None):
+        """Return the key for the given table coordinates."""
+        return (type, stripping, mode, polarity, scheme)
+
+    def _load(self, f):
+        """Fill the store from the lines of the open table file f."""
+        version = None
+        keys, values = [], []
+        for number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            fields = line.split()
+            if version is None:
+                if fields[0] != "version":
+                    log.error("No format version in {0}".format(self.path))
+                    raise ValueError("Table file has no version")
+                version = int(fields[1])
+                if version != format_version:
+                    log.error("Table format version {0} in {1}, "
+                              "expected {2}".format(
+                                  version, self.path, format_version
+                              ))
+                    raise ValueError("Unsupported table format version")
+                continue
+            if len(fields) != 6:
+                log.error("Malformed line {0} in {1}".format(
+                    number, self.path
+                ))
+                raise ValueError("Malformed table line: " + line)
+            type, stripping, modes, polarity, scheme, value = fields
+            keys.append((
+                type, stripping, modes.split(","), polarity,
+                None if scheme == "-" else scheme
+            ))
+            values.append(value)
+
+        for (type, stripping, modes, polarity, scheme), (value, error) in zip(
+                keys, parse_numbers_with_uncert(values)):
+            number = Variable(value, error, "{0} {1} {2} {3}".format(
+                type, stripping, ",".join(modes), polarity
+            ))
+            for mode in modes:
+                key = self.key(type, stripping, mode, polarity, scheme)
+                if key in self.entries:
+                    log.warning("Duplicate table entry {0}".format(key))
+                self.entries[key] = number
+
+    def get(self, type, stripping, mode, polarity, scheme=None):
+        """Return the tabulated number for the key.
+
+        The Combined polarity, if not tabulated, is derived from MagUp and
+        MagDown, see `polarity_combinations`, and stored.
+        Raises KeyError if there is no such entry.
+        """
+        key = self.key(type, stripping, mode, polarity, scheme)
+        try:
+            return self.entries[key]
+        except KeyError:
+            if polarity != config.magboth:
+                log.error("No tabulated {0} for {1}".format(type, key[1:]))
+                raise
+        up = self.get(type, stripping, mode, config.magup, scheme)
+        down = self.get(type, stripping, mode, config.magdown, scheme)
+        combine = polarity_combinations.get(type, lambda u, d: (u + d)/2)
+        value = self.entries[key] = combine(up, down)
+        return value
+
+
+# Store loaded on first use by `lookup`
+_store = None
+
+
+def store():
+    """Return the EfficiencyStore of the default table file."""
+    global _store
+    if _store is None:
+        _store = EfficiencyStore()
+    return _store
+
+
+def lookup(type, mode, polarity, year, scheme=None):
+    """Return the tabulated number for the mode, polarity and year.
+
+    The year's stripping version is taken from config.stripping_years.
+    """
+    return store().get(
+        type, config.stripping_years[year], mode, polarity, scheme
+    )
+
+
+def pid_scheme():
+    """Return the PID scheme selected by config.use_probnn."""
+    return "ProbNN" if config.use_probnn else "DLL"
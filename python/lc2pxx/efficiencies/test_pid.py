@@ -0,0 +1,73 @@
+"""
+Tests for lc2pxx.efficiencies.pid, with synthetic PIDCalib tables.
+
+These tests can be run through the Nose testing framework.
+"""
+
+import numpy as np
+from uncertainties import unumpy
+
+from lc2pxx.efficiencies import pid
+
+
+def make_table(seed):
+    """Return a PIDCalibTable of 2 P, 3 ETA and 2 nTracks bins."""
+    random = np.random.RandomState(seed)
+    edges = [
+        np.array([0., 10., 20.]),
+        np.array([2., 3., 4., 5.]),
+        np.array([0., 100., 200.])
+    ]
+    efficiencies = random.uniform(0.5, 1., (2, 3, 2))
+    errors = random.uniform(0.01, 0.05, (2, 3, 2))
+    return pid.PIDCalibTable(edges, efficiencies, errors)
+
+
+def test_bins():
+    """Tracks are mapped to the flat index of their bin."""
+    table = make_table(0)
+    p = np.array([5., 15., 15., 25., -1., 10.])
+    eta = np.array([2.5, 4.5, 3., 3., 3., 5.])
+    ntracks = np.array([50., 150., 0., 50., 50., 50.])
+    bins = table.bins(p, eta, ntracks)
+    # Edges belong to the bin above them, the last edge to no bin
+    expected = [
+        np.ravel_multi_index(index, (2, 3, 2)) if index is not None else -1
+        for index in ((0, 0, 0), (1, 2, 1), (1, 1, 0), None, None, None)
+    ]
+    assert list(bins) == expected
+
+
+def test_weighted_efficiency():
+    """The efficiency and its error are as with correlated ufloats.
+
+    The proton and kaon tables are independent, and the two pion tracks
+    share the same table, so that their efficiencies are correlated.
+    """
+    proton, kaon, pion = make_table(1), make_table(2), make_table(3)
+    random = np.random.RandomState(4)
+    n = 50
+    ntracks = random.uniform(0., 200., n)
+    weights = random.uniform(-0.2, 1., n)
+    tracks = [
+        (table, random.uniform(0., 20., n), random.uniform(2., 5., n))
+        for table in (proton, kaon, pion, pion)
+    ]
+    # The last candidate is outside the binning, and is excluded
+    ntracks[-1] = 300.
+
+    eff = pid.weighted_efficiency(tracks, ntracks, weights)
+
+    # Brute force, with one Variable per bin of each table
+    variables = dict(
+        (table, unumpy.uarray(table.efficiencies, table.errors).ravel())
+        for table in (proton, kaon, pion)
+    )
+    products = np.ones(n - 1, dtype=object)
+    for table, p, eta in tracks:
+        bins = table.bins(p, eta, ntracks)[:-1]
+        products = products*variables[table][bins]
+    expected = np.dot(weights[:-1], products)/weights[:-1].sum()
+
+    assert abs(eff.nominal_value - expected.nominal_value) < 1e-12
+    assert abs(eff.std_dev - expected.std_dev) < 1e-12
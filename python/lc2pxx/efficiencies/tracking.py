@@ -69,9 +69,10 @@ def efficiency_smeared(mode, polarity, year, toys=30):
     f_toys = float(toys)
     smeared_effs = []
     print "Generating tracking efficiency toys"
+    progress = utilities.ProgressBar(toys, stride=1)
     # Go from 1 as a seed of 0 is a "random seed", and so not deterministic
     for seed in range(1, toys + 1):
-        utilities.progress_bar(seed/f_toys)
+        progress.update(seed)
         smeared_table = smear_table(tracking_table, seed)
         total_eff = 1.
         for track in tracks:
@@ -79,8 +80,7 @@ def efficiency_smeared(mode, polarity, year, toys=30):
             total_eff *= eff
         # We're not worried about the error here, we'll derive it later
         smeared_effs.append(total_eff.nominal_value)
-    # Clear progress bar
-    print
+    progress.finish()
     tracking_table_f.Close()
 
     # Tracking efficiency is mean of smeared efficiencies
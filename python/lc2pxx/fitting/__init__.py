@@ -5,7 +5,13 @@ general fitting utilities.
 """
 
 __all__ = [
-    "lambdac_mass"
+    "lambdac_mass",
+    "splot",
+    "seeds",
+    "toys"
 ]
 
 import lambdac_mass
+import splot
+import seeds
+import toys
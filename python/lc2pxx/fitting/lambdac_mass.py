@@ -3,12 +3,16 @@ fitting
 Set of methods for fitting.
 """
 
+import time
 import logging as log
+import multiprocessing
 
 import ROOT
-from uncertainties import ufloat
+import numpy as np
+from uncertainties import ufloat, correlated_values
 
 from lc2pxx import config, utilities
+from lc2pxx.fitting import splot
 
 # String constants
 consts = {
@@ -19,10 +23,11 @@ consts = {
     "yield_sig": "yield_signal",
     "yield_bkg": "yield_background",
     "fit_result": "fit_result",
-    "sWeights": "sWeights"
+    "category": "sample"
 }
 
-def fit(ntuple, workspace, shapes, bins=0, weight=""):
+def fit(ntuple, workspace, shapes, bins=0, weight="", seeds=None,
+        options=None):
     """Fits an ntuple to the Lambda_c mass spectrum.
 
     Adds all PDF and variables to the workspace, along with the fit result.
@@ -38,6 +43,11 @@ def fit(ntuple, workspace, shapes, bins=0, weight=""):
     weight -- String of the variable in ntuple to act as per-event weights.
         The caller is responsible for having added the var to the workspace.
         (default "", no weighting)
+    seeds -- SeedStore instance. If given, the fit starts from the stored
+        parameters for the ntuple's mode, year, and shapes, and the
+        converged parameters are stored back in to it (default None)
+    options -- Dictionary of fit execution options, see `fit_options`
+        (default None, use the defaults in config)
     """
     log.info("Fitting Lc mass")
     # Workaround for `import` being a Python keyword
@@ -45,21 +55,11 @@ def fit(ntuple, workspace, shapes, bins=0, weight=""):
 
     shape_sig = shapes[0]
     shape_bkg = shapes[1]
-    entries = ntuple.GetEntries()
+    entries = ntuple.entries
 
-    # Add the fit variable as a string to the workspace, so it can be fetched
-    workspace_import(ROOT.TObjString(ntuple.Lc_M_fit_var), "fit_var")
-    fit_var = workspace.obj("fit_var").GetString().Data()
+    fit_var = _add_fit_var(workspace, ntuple)
     data_name = consts["data"]
 
-    # Add the mass variable and data to the workspace
-    workspace.factory("{0}[{1}, {2}]".format(
-        fit_var, ntuple.Lc_M_lo, ntuple.Lc_M_hi
-    ))
-    workspace.var(fit_var).SetTitle("m({0})".format(
-        utilities.latex_mode(ntuple.mode)
-    ))
-    workspace.var(fit_var).setUnit("MeV/#font[12]{c}^{2}")
     # Construct RooArgSet of variables needed for the fit
     if weight:
         vars = ROOT.RooArgList(
@@ -78,8 +78,10 @@ def fit(ntuple, workspace, shapes, bins=0, weight=""):
         h1 = ROOT.gDirectory.Get("h1")
         data = ROOT.RooDataHist(data_name, data_name, vars, h1)
     else:
+        branches = [fit_var, weight] if weight else [fit_var]
         data = ROOT.RooDataSet(
-            data_name, data_name, ntuple, ROOT.RooArgSet(vars), "", weight
+            data_name, data_name, ntuple.dataset_tree(branches),
+            ROOT.RooArgSet(vars), "", weight
         )
 
     workspace_import(data)
@@ -95,6 +97,8 @@ def fit(ntuple, workspace, shapes, bins=0, weight=""):
     # Add the shapes to the workspace
     add_pdf(shape_sig, workspace)
     add_pdf(shape_bkg, workspace)
+    if seeds is not None:
+        apply_seeds(workspace, seeds, ntuple, shapes)
 
     # Total PDF as the weighted sum of the signal and background
     workspace.factory("SUM::{0}({1}*{2}, {3}*{4})".format(
@@ -106,8 +110,8 @@ def fit(ntuple, workspace, shapes, bins=0, weight=""):
     ))
 
     # Perform the fit, adding the RooFitResult to the workspace
-    fit_result = workspace.pdf(consts["pdf_tot"]).fitTo(
-        workspace.data(data_name), ROOT.RooFit.NumCPU(2), ROOT.RooFit.Save(True)
+    fit_result, calls = _minimise(
+        workspace.pdf(consts["pdf_tot"]), workspace.data(data_name), options
     )
     workspace_import(fit_result, consts["fit_result"])
 
@@ -116,33 +120,254 @@ def fit(ntuple, workspace, shapes, bins=0, weight=""):
     fit_quality = fit_result.covQual()
     if fit_quality < 3:
         log.warning("Poor fit quality: {0}".format(fit_quality))
+    elif seeds is not None:
+        store_seeds(workspace, seeds, ntuple, shapes)
+
+
+def fit_simultaneous(ntuples, workspace, shapes, options=None):
+    """Simultaneously fits several ntuples to the Lambda_c mass spectrum.
+
+    Each ntuple, typically one per magnet polarity and year of a single
+    mode, is a state of the RooCategory consts["category"], labelled by
+    `category_label`. The signal and background shape parameters are
+    shared by all states, whilst each state has its own signal and
+    background yields, e.g. yield_signal_MagUp_2011. Everything is fitted
+    in a single minimisation, so no event is fitted twice and the yields
+    of each state are consistent with each other. Retrieve the yields with
+    `yields`, passing the category label.
+    Only unbinned, unweighted fits are supported.
+    Keyword arguments:
+    ntuples -- List of Lc2pXX instances of the same mode, each with a
+        different polarity and year
+    workspace -- RooWorkspace to hold the data, PDFs, and fit result
+    shapes -- 2-tuple of PDF shapes to fit with, as in `fit`
+    options -- Dictionary of fit execution options, see `fit_options`
+        (default None, use the defaults in config)
+    """
+    log.info("Simultaneously fitting Lc mass")
+    workspace_import = getattr(workspace, "import")
 
-    # sWeights requires an unbinned fit
-    if not bins:
-        log.info("Generating sWeights")
-        # sPlot requires all non-yields parameters of the model be constant
-        vars = workspace.allVars()
-        it = vars.createIterator()
-        var = it.Next()
-        yield_vars = (consts["yield_sig"], consts["yield_bkg"])
-        while var:
-            if var.GetName() not in yield_vars:
-                var.setConstant()
-            var = it.Next()
-        sweights = ROOT.RooStats.SPlot(
-            "sData",
-            "sData",
-            workspace.data(data_name),
-            workspace.pdf(consts["pdf_tot"]),
-            ROOT.RooArgList(
-                workspace.var(yield_vars[0]),
-                workspace.var(yield_vars[1])
-            )
+    fit_var = _add_fit_var(workspace, ntuples[0])
+    data_name = consts["data"]
+    labels = [category_label(ntuple) for ntuple in ntuples]
+    workspace.factory("{0}[{1}]".format(
+        consts["category"], ", ".join(labels)
+    ))
+    x = workspace.var(fit_var)
+    category = workspace.cat(consts["category"])
+
+    # Combined dataset, with each ntuple's entries in its own state
+    data = ROOT.RooDataSet(
+        data_name, data_name, ROOT.RooArgSet(x, category)
+    )
+    for ntuple, label in zip(ntuples, labels):
+        ntuple_data = ROOT.RooDataSet(
+            label, label, ntuple.dataset_tree([fit_var]), ROOT.RooArgSet(x),
+            "", ""
         )
-        workspace_import(sweights, consts["sWeights"])
+        category.setLabel(label)
+        ntuple_data.addColumn(category)
+        data.append(ntuple_data)
+    workspace_import(data)
+
+    # Shared shapes
+    add_pdf(shapes[0], workspace)
+    add_pdf(shapes[1], workspace)
+
+    # Per-state yields and total PDFs
+    states = []
+    for ntuple, label in zip(ntuples, labels):
+        entries = ntuple.entries
+        yield_sig = "{0}_{1}".format(consts["yield_sig"], label)
+        yield_bkg = "{0}_{1}".format(consts["yield_bkg"], label)
+        pdf_tot = "{0}_{1}".format(consts["pdf_tot"], label)
+        workspace.factory("{0}[{1}, 0, {2}]".format(
+            yield_sig, entries / 2, entries*10
+        ))
+        workspace.factory("{0}[{1}, 0, {2}]".format(
+            yield_bkg, entries / 2, entries*10
+        ))
+        workspace.factory("SUM::{0}({1}*{2}, {3}*{4})".format(
+            pdf_tot, yield_sig, consts["pdf_sig"], yield_bkg, consts["pdf_bkg"]
+        ))
+        states.append("{0}={1}".format(label, pdf_tot))
+    workspace.factory("SIMUL::{0}({1}, {2})".format(
+        consts["pdf_tot"], consts["category"], ", ".join(states)
+    ))
+
+    fit_result, calls = _minimise(
+        workspace.pdf(consts["pdf_tot"]), workspace.data(data_name), options
+    )
+    workspace_import(fit_result, consts["fit_result"])
+
+    fit_quality = fit_result.covQual()
+    if fit_quality < 3:
+        log.warning("Poor fit quality: {0}".format(fit_quality))
+
+
+def category_label(ntuple):
+    """Return the simultaneous fit category label for the ntuple.
+
+    The format of the label is {polarity}_{year}, e.g. MagUp_2011.
+    """
+    return "{0}_{1}".format(ntuple.polarity, ntuple.year)
+
+
+def _add_fit_var(workspace, ntuple):
+    """Add the ntuple's fit variable to the workspace, returning its name.
+
+    The name is also added as a TObjString called "fit_var", so that it
+    can be fetched from the workspace later.
+    """
+    workspace_import = getattr(workspace, "import")
+    workspace_import(ROOT.TObjString(ntuple.Lc_M_fit_var), "fit_var")
+    fit_var = workspace.obj("fit_var").GetString().Data()
+    workspace.factory("{0}[{1}, {2}]".format(
+        fit_var, ntuple.Lc_M_lo, ntuple.Lc_M_hi
+    ))
+    workspace.var(fit_var).SetTitle("m({0})".format(
+        utilities.latex_mode(ntuple.mode)
+    ))
+    workspace.var(fit_var).setUnit("MeV/#font[12]{c}^{2}")
+    return fit_var
+
+
+def fit_options(entries, options=None):
+    """Return the dictionary of fit execution options for a fit.
+
+    The options, and the config attributes providing their defaults, are
+        num_cpu -- Number of processes evaluating the likelihood
+            (config.fit_num_cpu)
+        batch_mode -- Use vectorised PDF evaluation (config.fit_batch_mode)
+        strategy -- MINUIT strategy (config.fit_strategy)
+        offset -- Offset the likelihood (config.fit_offset)
+    If num_cpu is None, one process is used per config.fit_entries_per_cpu
+    entries, up to the number of cores.
+    Keyword arguments:
+    entries -- Number of entries being fitted
+    options -- Dictionary overriding some or all of the defaults
+        (default None)
+    """
+    resolved = {
+        "num_cpu": config.fit_num_cpu,
+        "batch_mode": config.fit_batch_mode,
+        "strategy": config.fit_strategy,
+        "offset": config.fit_offset
+    }
+    resolved.update(options or {})
+    if resolved["num_cpu"] is None:
+        resolved["num_cpu"] = max(1, min(
+            multiprocessing.cpu_count(),
+            int(entries) // config.fit_entries_per_cpu
+        ))
+    return resolved
+
+
+def _minimise(pdf, data, options=None, print_level=1):
+    """Minimise the NLL of pdf on data with MINUIT.
+
+    This is equivalent to pdf.fitTo(data), running MIGRAD then HESSE, but
+    also returns the number of function calls MINUIT made, as a 2-tuple
+    (RooFitResult, calls). The wall-clock time and number of calls are
+    logged at INFO level.
+    Keyword arguments:
+    options -- Dictionary of fit execution options, see `fit_options`
+        (default None, use the defaults in config)
+    print_level -- MINUIT print level, -1 for silence (default: 1)
+    """
+    options = fit_options(data.numEntries(), options)
+    args = [ROOT.RooFit.NumCPU(options["num_cpu"])]
+    if options["offset"]:
+        args.append(ROOT.RooFit.Offset(True))
+    if options["batch_mode"]:
+        if hasattr(ROOT.RooFit, "BatchMode"):
+            args.append(ROOT.RooFit.BatchMode(True))
+        else:
+            log.warning("Batch mode not supported by this ROOT version")
+    start = time.time()
+    nll = pdf.createNLL(data, *args)
+    minimizer = ROOT.RooMinimizer(nll)
+    minimizer.setPrintLevel(print_level)
+    minimizer.setStrategy(options["strategy"])
+    minimizer.migrad()
+    minimizer.hesse()
+    fit_result = minimizer.save()
+    calls = minimizer.fitter().Result().NCalls()
+    log.info("Fit of {0} entries took {1:.1f} s, {2} MINUIT calls {3}".format(
+        data.numEntries(), time.time() - start, calls, options
+    ))
+    return fit_result, calls
+
+def _parameters(workspace, pdf_name):
+    """Return a list of the floating RooRealVar parameters of the PDF."""
+    x = workspace.var(workspace.obj("fit_var").GetString().Data())
+    params = workspace.pdf(pdf_name).getParameters(ROOT.RooArgSet(x))
+    parameters = []
+    it = params.createIterator()
+    var = it.Next()
+    while var:
+        if not var.isConstant():
+            parameters.append(var)
+        var = it.Next()
+    return parameters
 
 
-def yields(workspace):
+def _seed_groups(workspace, ntuple, shapes):
+    """Return a list of (shape, parameters, scale) tuples for seeding.
+
+    The yields are grouped under the shape "yields", and are scaled by the
+    number of entries so that they are stored as fractions.
+    """
+    entries = float(ntuple.entries)
+    return [
+        (shapes[0], _parameters(workspace, consts["pdf_sig"]), 1.),
+        (shapes[1], _parameters(workspace, consts["pdf_bkg"]), 1.),
+        ("yields", [
+            workspace.var(consts["yield_sig"]),
+            workspace.var(consts["yield_bkg"])
+        ], entries)
+    ]
+
+
+def apply_seeds(workspace, seeds, ntuple, shapes):
+    """Set the initial values and step sizes of the fit parameters.
+
+    Parameters of each shape are taken from seeds under the key
+    (ntuple.mode, ntuple.year, shape). The yields are stored as fractions
+    of the number of entries, under the shape key "yields". Each
+    parameter's value is set to the seed, within its range, and its error,
+    which MINUIT uses as the initial step size, to the seed's error.
+    Keyword arguments:
+    workspace -- RooWorkspace containing the PDFs and variables
+    seeds -- SeedStore instance
+    ntuple -- Lc2pXX instance being fitted
+    shapes -- 2-tuple of signal and background PDF shapes
+    """
+    for shape, parameters, scale in _seed_groups(workspace, ntuple, shapes):
+        shape_seeds = seeds.get(ntuple.mode, ntuple.year, shape)
+        for var in parameters:
+            try:
+                value, error = shape_seeds[var.GetName()]
+            except KeyError:
+                continue
+            value = min(max(scale*value, var.getMin()), var.getMax())
+            log.info("Seeding {0} = {1} +/- {2}".format(
+                var.GetName(), value, scale*error
+            ))
+            var.setVal(value)
+            var.setError(scale*error)
+
+
+def store_seeds(workspace, seeds, ntuple, shapes):
+    """Store the fitted parameters in seeds, see `apply_seeds`."""
+    for shape, parameters, scale in _seed_groups(workspace, ntuple, shapes):
+        seeds.set(ntuple.mode, ntuple.year, shape, [
+            (var.GetName(), (var.getVal()/scale, var.getError()/scale))
+            for var in parameters
+        ])
+
+
+def yields(workspace, category=None):
     """Return the signal and background yields in the signal region.
 
     The signal region is defined as +/- 3 sigma around the mean of the
@@ -150,6 +375,8 @@ def yields(workspace):
     The returned yields are ufloats.
     Keyword arguments:
     workspace -- RooWorkspace containing the fit result, PDFs and variables
+    category -- Category label of the yields to return, if the workspace
+        holds a simultaneous fit, see `category_label` (default None)
     """
     if workspace.obj(consts["fit_result"]) == None:
         log.error("Cannot calculate yields, PDFs have not been fitted")
@@ -180,8 +407,13 @@ def yields(workspace):
         x_set, x_set, region
     ).getVal()
 
-    yield_sig_var = workspace.var(consts["yield_sig"])
-    yield_bkg_var = workspace.var(consts["yield_bkg"])
+    yield_sig_name = consts["yield_sig"]
+    yield_bkg_name = consts["yield_bkg"]
+    if category is not None:
+        yield_sig_name = "{0}_{1}".format(yield_sig_name, category)
+        yield_bkg_name = "{0}_{1}".format(yield_bkg_name, category)
+    yield_sig_var = workspace.var(yield_sig_name)
+    yield_bkg_var = workspace.var(yield_bkg_name)
     yield_sig_num = int_sig*yield_sig_var.getVal()
     yield_sig_err = int_sig*yield_sig_var.getError()
     yield_bkg_num = int_bkg*yield_bkg_var.getVal()
@@ -193,13 +425,99 @@ def yields(workspace):
     return (yield_sig, yield_bkg)
 
 
-def sweights(workspace):
-    """Return sWeights dataset from the fit."""
-    sweights = workspace.obj(consts["sWeights"])
-    if sweights == None:
-        log.error("Could not retrieve sWeights, fit not performed")
-    return sweights
+def correlated_parameters(workspace, names=None):
+    """Return a dictionary of fitted parameter name to correlated ufloat.
+
+    The ufloats reproduce the covariance matrix of the fit result, so
+    quantities derived from several parameters, such as ratios of yields,
+    have the correct error.
+    The covariance matrix is copied straight from the fit result's buffer,
+    and its diagonalisation is cached by `uncertainties`, so calling this
+    repeatedly for the same fit is cheap.
+    Keyword arguments:
+    workspace -- RooWorkspace containing the fit result
+    names -- List of floating parameter names (default: None, all)
+    """
+    fit_result = workspace.obj(consts["fit_result"])
+    if fit_result == None:
+        log.error("Cannot get parameters, PDFs have not been fitted")
+        return
+
+    floating = fit_result.floatParsFinal()
+    n = floating.getSize()
+    all_names = [floating.at(i).GetName() for i in range(n)]
+    if names is None:
+        names = all_names
+    indices = [all_names.index(name) for name in names]
+
+    # Keep a reference to the matrix, which owns the buffer
+    cov_matrix = fit_result.covarianceMatrix()
+    buf = cov_matrix.GetMatrixArray()
+    buf.SetSize(n*n)
+    cov = np.frombuffer(buf, dtype=np.float64).reshape(n, n)
+    values = [floating.at(i).getVal() for i in indices]
+    parameters = correlated_values(
+        values, cov[np.ix_(indices, indices)], tags=names
+    )
+    return dict(zip(names, parameters))
+
+
+def pdf_values(workspace, pdf_name, masses, grid=2000):
+    """Return a numpy array of the normalised PDF evaluated at each mass.
 
+    The PDF is evaluated once per point on a uniform grid spanning the fit
+    range, and the per-event values are then linearly interpolated from
+    the grid with numpy, so the cost is independent of the number of
+    events. With the default grid spacing of 0.07 MeV/c^2 the relative
+    interpolation error is below 1e-4 for the shapes in this module.
+    Keyword arguments:
+    workspace -- RooWorkspace containing the fitted PDF
+    pdf_name -- Name of the PDF in the workspace, e.g. consts["pdf_sig"]
+    masses -- Array of fit variable values to evaluate the PDF at
+    grid -- Number of grid points. If 0, the PDF is evaluated exactly at
+        every mass instead (default: 2000)
+    """
+    x = workspace.var(workspace.obj("fit_var").GetString().Data())
+    x_set = ROOT.RooArgSet(x)
+    pdf = workspace.pdf(pdf_name)
+    masses = np.asarray(masses, dtype=float)
+    points = np.linspace(x.getMin(), x.getMax(), grid) if grid else masses
+    # Evaluating the PDF moves the variable, so restore it afterwards
+    original = x.getVal()
+    values = np.empty(len(points))
+    for i, point in enumerate(points):
+        x.setVal(point)
+        values[i] = pdf.getVal(x_set)
+    x.setVal(original)
+    return np.interp(masses, points, values) if grid else values
+
+
+def sweights(workspace, masses, grid=2000):
+    """Return a 2-tuple of signal and background sWeight numpy arrays.
+
+    The sWeights are computed with lc2pxx.fitting.splot from the fitted PDFs
+    and yields in workspace, for the events with the given masses. The
+    masses should be those of the dataset used in the (unbinned) fit.
+    Keyword arguments:
+    workspace -- RooWorkspace containing the fit result, PDFs and variables
+    masses -- Array of fit variable values, one per event
+    grid -- Number of points used to evaluate the PDFs, see `pdf_values`
+        (default: 2000)
+    """
+    if workspace.obj(consts["fit_result"]) == None:
+        log.error("Could not compute sWeights, fit not performed")
+        return
+    log.info("Generating sWeights")
+    values = [
+        pdf_values(workspace, consts["pdf_sig"], masses, grid),
+        pdf_values(workspace, consts["pdf_bkg"], masses, grid)
+    ]
+    yields = [
+        workspace.var(consts["yield_sig"]).getVal(),
+        workspace.var(consts["yield_bkg"]).getVal()
+    ]
+    signal_sw, background_sw = splot.sweights(values, yields)
+    return signal_sw, background_sw
 
 def add_pdf(key, workspace):
     """Add a PDF to the workspace, of type specified by the key."""
@@ -0,0 +1,65 @@
+"""
+seeds
+Storage of converged fit parameters, used to warm-start later fits.
+
+Samples fitted many times, such as per polarity, before and after
+selection, and for systematics variations, converge to very similar
+parameters each time. Starting MINUIT from the previous result, with step
+sizes set from the previous errors, saves many function calls.
+"""
+
+import os
+import json
+import logging as log
+
+from lc2pxx import utilities
+
+class SeedStore:
+    """Converged parameter values and errors, keyed by (mode, year, shape).
+
+    The store maps keys to dictionaries of parameter name to a
+    (value, error) pair. It is optionally backed by a JSON file, which is
+    read on initialisation and written by `save`.
+    """
+    def __init__(self, path=None):
+        """Initialise a SeedStore, loading the seeds at path if it exists.
+
+        Keyword arguments:
+        path -- Path to the JSON file backing the store. If None, the
+            store is held in memory only (default: None)
+        """
+        self.path = path
+        self.seeds = {}
+        if path is not None and utilities.file_exists(path):
+            log.info("Loading fit seeds from {0}".format(path))
+            with open(path) as f:
+                self.seeds = json.load(f)
+
+    @staticmethod
+    def key(mode, year, shape):
+        """Return the string key for the mode, year, and shape."""
+        return "{0}-{1}-{2}".format(mode, year, shape)
+
+    def get(self, mode, year, shape):
+        """Return the dictionary of seeds for the key, or an empty dict."""
+        return self.seeds.get(self.key(mode, year, shape), {})
+
+    def set(self, mode, year, shape, parameters):
+        """Store the parameters dictionary for the key.
+
+        Keyword arguments:
+        parameters -- Dictionary of parameter name to (value, error) pair
+        """
+        self.seeds[self.key(mode, year, shape)] = dict(parameters)
+
+    def save(self):
+        """Write the store to its JSON file, if it has one."""
+        if self.path is None:
+            log.warning("Not saving fit seeds, SeedStore has no path")
+            return
+        log.info("Saving fit seeds to {0}".format(self.path))
+        directory = os.path.dirname(self.path)
+        if directory and not utilities.file_exists(directory):
+            os.makedirs(directory)
+        with open(self.path, "w") as f:
+            json.dump(self.seeds, f, indent=2, sort_keys=True)
@@ -0,0 +1,49 @@
+"""
+splot
+Calculation of sWeights from per-event PDF values using numpy.
+
+This is the sPlot technique (arXiv physics/0402083) without the RooFit
+machinery: the inputs are arrays of the normalised species PDFs evaluated
+at each event, and the fitted yields, and the outputs are arrays of
+sWeights, one per species.
+"""
+
+import numpy as np
+
+def _scaled_pdfs(pdf_values, yields):
+    """Return the PDF values divided by the total PDF at each event."""
+    pdfs = np.asarray(pdf_values, dtype=float)
+    return pdfs/np.dot(np.asarray(yields, dtype=float), pdfs)
+
+
+def inverse_covariance(pdf_values, yields):
+    """Return the inverse of the yields covariance matrix.
+
+    The elements are
+        V^-1_ij = sum_e f_i(x_e) f_j(x_e) / (sum_k N_k f_k(x_e))^2,
+    where f_i is the PDF of species i, N_k the yield of species k, and the
+    sum runs over the events e.
+    Keyword arguments:
+    pdf_values -- 2D array-like, shape (species, events), of normalised
+        PDF values for each species at each event
+    yields -- 1D array-like of fitted yields, one per species
+    """
+    scaled = _scaled_pdfs(pdf_values, yields)
+    return np.dot(scaled, scaled.T)
+
+
+def sweights(pdf_values, yields):
+    """Return a 2D array of sWeights, shape (species, events).
+
+    The sWeight of species n for event e is
+        sW_n(x_e) = sum_j V_nj f_j(x_e) / sum_k N_k f_k(x_e),
+    where V is the inverse of `inverse_covariance`. Row n of the returned
+    array holds the sWeights of species n, in the same order as `yields`.
+    Keyword arguments:
+    pdf_values -- 2D array-like, shape (species, events), of normalised
+        PDF values for each species at each event
+    yields -- 1D array-like of fitted yields, one per species
+    """
+    scaled = _scaled_pdfs(pdf_values, yields)
+    covariance = np.linalg.inv(np.dot(scaled, scaled.T))
+    return np.dot(covariance, scaled)
@@ -0,0 +1,214 @@
+"""
+toys
+Validation of the Lambda_c mass fit with toy Monte Carlo.
+
+Pseudo-experiments are generated from the total PDF of a fitted
+workspace, with the fitted parameters as the truth, and each is then
+fitted with the same model. The pulls of the yields and of the signal
+mean and widths show whether the fit is biased, and whether its errors
+are correct.
+The toys are spread over a pool of processes. Each worker reads its own
+copy of the workspace from a temporary file, then generates and fits a
+chunk of toys, so the work scales with the number of cores.
+"""
+
+import time
+import logging as log
+import multiprocessing
+
+import ROOT
+import numpy as np
+from uncertainties import ufloat
+
+from lc2pxx import utilities
+from lc2pxx.fitting import lambdac_mass
+
+# Parameters whose pulls are recorded, if they are in the workspace
+default_parameters = (
+    lambdac_mass.consts["yield_sig"],
+    lambdac_mass.consts["yield_bkg"],
+    "mu",
+    "sigma",
+    "sigma_one",
+    "sigma_two"
+)
+
+def run(workspace, toys, processes=None, seed=1, parameters=None,
+        chunk_size=10, options=None):
+    """Generate and fit toys from the workspace, returning the results.
+
+    The results are a numpy structured array with one row per toy. The
+    fields are the toy's seed, the fit status, the covariance matrix
+    quality (covQual), and the wall-clock time in seconds taken to
+    generate and fit the toy, then {par}_value, {par}_error, and
+    {par}_pull for each parameter.
+    The pull is (fitted - true)/error.
+    Keyword arguments:
+    workspace -- RooWorkspace containing an unbinned fit from
+        lambdac_mass.fit
+    toys -- Number of pseudo-experiments
+    processes -- Number of worker processes (default: None, one per core)
+    seed -- Seed of the first toy, toy i is generated with seed + i. Must
+        be non-zero, else the toys are not reproducible (default: 1)
+    parameters -- List of parameter names to record (default: those in
+        default_parameters which exist in the workspace)
+    chunk_size -- Number of toys each worker fits per task (default: 10)
+    options -- Dictionary of fit execution options for the toy fits, see
+        lambdac_mass.fit_options. As the toys are already run in parallel,
+        num_cpu defaults to 1 (default: None)
+    """
+    if parameters is None:
+        parameters = [p for p in default_parameters if workspace.var(p)]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    toy_options = {"num_cpu": 1}
+    toy_options.update(options or {})
+    log.info("Running {0} toys over {1} processes".format(toys, processes))
+
+    # Workers read the workspace from disk rather than have it pickled
+    temp_file = utilities.create_temp_file()
+    temp_file_path = temp_file.GetEndpointUrl().GetFile()
+    workspace.Write()
+    temp_file.Close()
+
+    seeds = range(seed, seed + toys)
+    tasks = [
+        (temp_file_path, workspace.GetName(), seeds[i:i + chunk_size],
+         parameters, toy_options)
+        for i in range(0, toys, chunk_size)
+    ]
+    pool = multiprocessing.Pool(processes)
+    records = []
+    progress = utilities.ProgressBar(toys, stride=1)
+    try:
+        for chunk in pool.imap_unordered(_fit_toys, tasks):
+            records += chunk
+            progress.add(len(chunk))
+        progress.finish()
+    finally:
+        pool.close()
+        pool.join()
+        utilities.delete_temp_file(temp_file)
+
+    results = np.array(records, dtype=_dtype(parameters))
+    results.sort(order="seed")
+    return results
+
+
+def _dtype(parameters):
+    """Return the numpy dtype of the toy results for the parameters."""
+    fields = [
+        ("seed", np.int64),
+        ("status", np.int32),
+        ("cov_qual", np.int32),
+        ("time", np.float64)
+    ]
+    for p in parameters:
+        for suffix in ("value", "error", "pull"):
+            fields.append(("{0}_{1}".format(p, suffix), np.float64))
+    return np.dtype(fields)
+
+
+def _fit_toys(task):
+    """Generate and fit a chunk of toys, returning a list of records.
+
+    This is run in the worker processes, so takes a single tuple argument
+    (path, workspace_name, seeds, parameters, options) and returns plain
+    tuples.
+    """
+    path, workspace_name, seeds, parameters, options = task
+    ROOT.RooMsgService.instance().setGlobalKillBelow(ROOT.RooFit.WARNING)
+    f = ROOT.TFile(path)
+    workspace = f.Get(workspace_name)
+    pdf = workspace.pdf(lambdac_mass.consts["pdf_tot"])
+    x = workspace.var(workspace.obj("fit_var").GetString().Data())
+    x_set = ROOT.RooArgSet(x)
+    # The fitted parameters are the truth for all toys
+    floating = pdf.getParameters(x_set)
+    truth_set = floating.snapshot()
+    truth = dict((p, workspace.var(p).getVal()) for p in parameters)
+
+    records = []
+    for seed in seeds:
+        start = time.time()
+        floating.assignValueOnly(truth_set)
+        ROOT.RooRandom.randomGenerator().SetSeed(seed)
+        data = pdf.generate(x_set, ROOT.RooFit.Extended())
+        fit_result, calls = lambdac_mass._minimise(
+            pdf, data, options, print_level=-1
+        )
+        record = [
+            seed,
+            fit_result.status(),
+            fit_result.covQual(),
+            time.time() - start
+        ]
+        fitted = fit_result.floatParsFinal()
+        for p in parameters:
+            var = fitted.find(p)
+            value = var.getVal()
+            error = var.getError()
+            pull = (value - truth[p])/error if error > 0 else float("nan")
+            record += [value, error, pull]
+        records.append(tuple(record))
+    f.Close()
+    return records
+
+
+def summary(results, parameters=None, cov_qual=3):
+    """Return a dictionary of parameter to (pull mean, pull width) ufloats.
+
+    Only toys with a covariance matrix quality of at least cov_qual are
+    used. An unbiased fit with correct errors has a pull mean of zero and
+    a pull width of one.
+    Keyword arguments:
+    results -- Structured array returned by `run`
+    parameters -- List of parameter names (default: all in results)
+    cov_qual -- Minimum covariance matrix quality (default: 3)
+    """
+    if parameters is None:
+        parameters = [
+            name[:-len("_pull")] for name in results.dtype.names
+            if name.endswith("_pull")
+        ]
+    converged = results[results["cov_qual"] >= cov_qual]
+    n = len(converged)
+    log.info("{0} of {1} toys converged".format(n, len(results)))
+    pulls = {}
+    for p in parameters:
+        pull = converged["{0}_pull".format(p)]
+        mean = pull.mean()
+        width = pull.std()
+        pulls[p] = (
+            ufloat(mean, width/np.sqrt(n)),
+            ufloat(width, width/np.sqrt(2.*n))
+        )
+    return pulls
+
+
+def save(results, path):
+    """Save the results array returned by `run` as a compressed .npz."""
+    np.savez_compressed(path, toys=results)
+
+
+def load(path):
+    """Return the results array saved by `save`."""
+    return np.load(path)["toys"]
+
+
+def to_tree(results, name="toys"):
+    """Return a TTree with one branch per field of the results array."""
+    t = ROOT.TTree(name, name)
+    types = {np.dtype(np.int64): "L", np.dtype(np.int32): "I"}
+    buffers = {}
+    for field in results.dtype.names:
+        dtype = results.dtype[field]
+        buffers[field] = np.zeros(1, dtype=dtype)
+        t.Branch(field, buffers[field], "{0}/{1}".format(
+            field, types.get(dtype, "D")
+        ))
+    for row in results:
+        for field in results.dtype.names:
+            buffers[field][0] = row[field]
+        t.Fill()
+    return t
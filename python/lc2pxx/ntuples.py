@@ -6,17 +6,19 @@ as well as classes representing such ntuples.
 
 import os
 import logging as log
-from math import fabs, atan2, asin
+from math import fabs, atan2, asin, fsum
 
 import ROOT
 import numpy as np
 from uncertainties import ufloat
 
-from lc2pxx import config, utilities, fitting, Ntuple, Lc2pXX
+from lc2pxx import config, utilities, staging, fitting, Ntuple, Lc2pXX
 
 def ntuple_path(polarity, year, mc, mode=None):
     """Return the path to the ntuple of the specified type.
 
+    The ntuple in the work area is copied to local scratch on first use,
+    and the path to the copy is returned, see lc2pxx.staging.
     Keyword arguments:
     polarity -- One of lc2pxx.config.polarities
     year -- One of lc2pxx.config.years
@@ -27,11 +29,7 @@ def ntuple_path(polarity, year, mc, mode=None):
         log.warning("Cannot return path for MagBoth polarity")
         return None
 
-    # Local data, or over AFS?
-    data_dir = [
-        config.work_data_dir,
-        config.scratch_data_dir
-    ][config.use_scratch]
+    data_dir = config.work_data_dir
     # There's one MC ntuple per mode, but one for all modes for collision
     if mc is True:
         base = "{0}/{1}/{2}/{3}".format(
@@ -56,8 +54,9 @@ def ntuple_path(polarity, year, mc, mode=None):
 
     if not utilities.file_exists(path):
         log.error("File at `{0}` not found".format(path))
+        return path
 
-    return path
+    return staging.stage(path)
 
 
 def selected_path(mode, polarity, year):
@@ -158,18 +157,20 @@ def luminosity(polarity, year):
     lumi_ntuple = Ntuple.Ntuple("GetIntegratedLuminosity/LumiTuple")
 
     if polarity in (config.magup, config.magboth):
-        lumi_ntuple.add(ntuple_path(config.magup, year, mc))
+        lumi_ntuple.add(ntuple_path(config.magup, year, False))
     if polarity in (config.magdown, config.magboth):
-        lumi_ntuple.add(ntuple_path(config.magdown, year, mc))
+        lumi_ntuple.add(ntuple_path(config.magdown, year, False))
 
-    total_lumi = 0.
-    total_lumi_error = 0.
     log.info("Luminosity ntuple ({0} {1}) has {2} entries".format(
         year, polarity, lumi_ntuple.entries
     ))
-    for entry in lumi_ntuple:
-        total_lumi += lumi_ntuple.val("IntegratedLuminosity")
-        total_lumi_error += lumi_ntuple.val("IntegratedLuminosityErr")
+    lumi = lumi_ntuple.arrays(
+        ["IntegratedLuminosity", "IntegratedLuminosityErr"]
+    )
+    # The per-file errors are dominated by the common luminosity
+    # calibration, so are fully correlated and add linearly
+    total_lumi = fsum(lumi["IntegratedLuminosity"])
+    total_lumi_error = fsum(lumi["IntegratedLuminosityErr"])
 
     return ufloat(total_lumi, total_lumi_error)
 
@@ -254,19 +255,12 @@ def create_metatree(ntuple):
         fitting.lambdac_mass.fit(
             nt, workspace, ntuple.shapes_preselection
         )
-        sweights = fitting.lambdac_mass.sweights(workspace)
-    # Dataset holding the sWeights and Lc_M variables
-    sweights_ds = sweights.GetSDataSet()
-    sw_argset = sweights_ds.get()
-    sw_lc_m = sw_argset.find(fit_var)
-    sw_sig = sw_argset.find("{0}_sw".format(
-        fitting.lambdac_mass.consts["yield_sig"]
-    ))
-    sw_bkg = sw_argset.find("{0}_sw".format(
-        fitting.lambdac_mass.consts["yield_bkg"]
-    ))
+        masses = nt.arrays([fit_var])[fit_var]
+        sweights_sig, sweights_bkg = fitting.lambdac_mass.sweights(
+            workspace, masses
+        )
     # As we only create sWeights for accepted and triggered events,
-    # we must have a counter for the sWeight dataset
+    # we must have a counter for the sWeight arrays
     sw_entry = 0
 
     # Mersenne Twistor
@@ -296,15 +290,14 @@ def create_metatree(ntuple):
         triggered[0] = ntuple.passes_trigger()
         # Add non-zero sWeights to triggered events
         if triggered[0] and accepted[0]:
-            sweights_ds.get(sw_entry)
             # Check the index is OK
-            if fabs(lc_m[0] - sw_lc_m.getVal()) > 0.1:
+            if fabs(lc_m[0] - masses[sw_entry]) > 0.1:
                 raise ValueError("sWeights mismatch: {0} - {1}".format(
-                    lc_m[0], sw_lc_m.getVal()
+                    lc_m[0], masses[sw_entry]
                 ))
-            signal_sw[0] = sw_sig.getVal()
-            background_sw[0] = sw_bkg.getVal()
-            sum_sw[0] = sweights.GetSumOfEventSWeight(sw_entry)
+            signal_sw[0] = sweights_sig[sw_entry]
+            background_sw[0] = sweights_bkg[sw_entry]
+            sum_sw[0] = signal_sw[0] + background_sw[0]
             sw_entry += 1
         else:
             signal_sw[0] = background_sw[0] = sum_sw[0] = 0
@@ -0,0 +1,159 @@
+"""
+scratch
+Uniquely named temporary files, deleted when no longer needed.
+
+Each ScratchSpace is a new directory, created in config.scratch_data_dir if
+it exists (see config.use_scratch), else in $TMPDIR. Its files are deleted,
+along with the directory, when the space is used as a context manager and
+the block exits, or else when the process exits. Usage:
+
+    with scratch.ScratchSpace() as space:
+        f = space.create_file()
+        ...
+
+The total size of the files is checked against a quota, from
+config.scratch_quota by default, when a file is created, or on calling
+check_quota.
+"""
+
+import os
+import atexit
+import shutil
+import tempfile
+import logging as log
+
+from lc2pxx import config
+
+# Directories of the spaces not yet cleaned up, to the ID of the process
+# that created them, which deletes them at exit. The spaces themselves
+# aren't kept, so that they can be freed when no longer used
+_directories = {}
+
+
+def default_root():
+    """Return the directory in which new scratch spaces are created."""
+    if config.use_scratch:
+        return config.scratch_data_dir
+    # Honours $TMPDIR
+    return tempfile.gettempdir()
+
+
+class ScratchSpace:
+    """Directory of uniquely named temporary files."""
+    def __init__(self, root=None, quota=None):
+        """Initialise a ScratchSpace, creating its directory.
+
+        Keyword arguments:
+        root -- Directory to create the space in (default: default_root())
+        quota -- Maximum total size of the files in bytes, None for no
+            limit (default: config.scratch_quota)
+        """
+        if root is None:
+            root = default_root()
+        self.quota = config.scratch_quota if quota is None else quota
+        self.directory = tempfile.mkdtemp(prefix="lc2pxx-", dir=root)
+        # Paths of the files created, which may be deleted
+        self.paths = []
+        # Only the creating process cleans up, not e.g. forked workers
+        self.pid = os.getpid()
+        log.info("Created scratch space `{0}`".format(self.directory))
+        _directories[self.directory] = self.pid
+
+    def __enter__(self):
+        """Use with e.g. `with ScratchSpace() as space:`"""
+        return self
+
+    def __exit__(self, type, value, traceback):
+        """Deletes all files in the space."""
+        self.cleanup()
+
+    def path(self, suffix=".root"):
+        """Return the path to a new, empty, uniquely named file.
+
+        Raises IOError if the space is over its quota.
+        """
+        self.check_quota()
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.directory)
+        os.close(fd)
+        self.paths.append(path)
+        return path
+
+    def create_file(self):
+        """Return a new temporary TFile, opened for writing."""
+        import ROOT
+        path = self.path()
+        log.info("Creating temporary TFile `{0}`".format(path))
+        return ROOT.TFile(path, "recreate")
+
+    def used_bytes(self):
+        """Return the total size of the files in the space, in bytes."""
+        return sum(
+            os.path.getsize(path) for path in self.paths
+            if os.path.exists(path)
+        )
+
+    def check_quota(self):
+        """Raise IOError if the files in the space exceed the quota."""
+        if self.quota is None:
+            return
+        used = self.used_bytes()
+        if used > self.quota:
+            log.error("Scratch space `{0}` uses {1} bytes, quota is "
+                      "{2}".format(self.directory, used, self.quota))
+            raise IOError("Scratch space quota exceeded")
+
+    def delete(self, file):
+        """Delete a file created in the space.
+
+        Keyword arguments:
+        file -- Path or TFile of the file, which is closed if open
+        """
+        if isinstance(file, basestring):
+            path = file
+        else:
+            path = file.GetEndpointUrl().GetFile()
+            if file.IsOpen():
+                file.Close()
+        # Prevent accidental deletion of non-temporary files
+        if path not in self.paths:
+            log.error("Refusing to delete 'temporary' file `{0}`".format(
+                path
+            ))
+            return
+        log.info("Deleting temporary file `{0}`".format(path))
+        self.paths.remove(path)
+        try:
+            os.remove(path)
+        except OSError:
+            log.error("Could not remove file at `{0}`".format(path))
+
+    def cleanup(self):
+        """Delete all files in the space, and its directory."""
+        if os.getpid() != self.pid or not os.path.exists(self.directory):
+            return
+        log.info("Deleting scratch space `{0}`".format(self.directory))
+        self.paths = []
+        shutil.rmtree(self.directory, ignore_errors=True)
+        _directories.pop(self.directory, None)
+
+
+# Space created on first use by `default_space`
+_default_space = None
+
+
+@atexit.register
+def _cleanup_directories():
+    """Delete the directories of the spaces left at exit."""
+    for directory, pid in _directories.items():
+        if pid != os.getpid():
+            continue
+        log.info("Deleting scratch space `{0}`".format(directory))
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def default_space():
+    """Return the ScratchSpace shared by the process."""
+    global _default_space
+    if _default_space is None:
+        _default_space = ScratchSpace()
+    return _default_space
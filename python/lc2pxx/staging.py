@@ -0,0 +1,255 @@
+"""
+staging
+Copies of ntuples on local scratch, made on first use.
+
+Ntuples in the work area, config.work_data_dir, are often on a network
+filesystem. `stage` copies a file in to config.staging_dir, on local
+scratch, mirroring its path relative to the work area, and returns the path
+to the copy, which later jobs reuse.
+
+A copy is reused only if its size and modification time match the
+original, else it is replaced. The total size of the copies is kept below
+config.staging_quota by deleting the least recently used copies first.
+Jobs sharing the staging directory lock each file while staging it, so
+that a file is only copied once, and a copy is never seen before it is
+complete. A job then holds a shared lock on each copy it uses until it
+exits, or calls `release`, and copies in use are never evicted. Only the
+eviction takes an exclusive lock on the whole directory, during which the
+size of a new copy is reserved, so that jobs copying different files at
+once stay within the quota together.
+Staging is disabled if config.use_staging is False, or if there is no
+local scratch (see config.use_scratch).
+"""
+
+import os
+import time
+import errno
+import shutil
+import fcntl
+import logging as log
+
+from lc2pxx import config, utilities
+
+# Name of the lock file of the staging directory, taken while evicting
+lock_name = ".lock"
+# Suffix of the lock file of each copy, taken while staging the copy
+lock_suffix = ".lock"
+# Suffix of copies being made
+partial_suffix = ".partial"
+
+
+def _running(pid):
+    """Return True if a process with the ID pid is running."""
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+class StagingArea:
+    """Directory of local copies of files, with a quota on their size."""
+    def __init__(self, directory, quota, source_dir=None):
+        """Initialise a StagingArea, creating its directory if needed.
+
+        Keyword arguments:
+        directory -- Directory holding the copies
+        quota -- Maximum total size of the copies in bytes
+        source_dir -- Directory whose layout is mirrored, the full path
+            of the original file being used for files outside it
+            (default: None)
+        """
+        self.directory = directory
+        self.quota = quota
+        self.source_dir = source_dir
+        # Open copies, keyed by path, on which a shared lock is held
+        self.in_use = {}
+        utilities.make_dirs(directory)
+
+    def local_path(self, path):
+        """Return the path of the copy of the file at path."""
+        path = os.path.abspath(path)
+        if self.source_dir is not None:
+            source_dir = os.path.abspath(self.source_dir)
+            if path.startswith(source_dir + os.sep):
+                return os.path.join(
+                    self.directory, os.path.relpath(path, source_dir)
+                )
+        return os.path.join(self.directory, path.lstrip(os.sep))
+
+    def copies(self):
+        """Return a list of (last use, size, path) of the copies."""
+        copies = []
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if (filename.endswith(lock_suffix) or
+                        filename.endswith(partial_suffix)):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # Evicted by another job meanwhile
+                    continue
+                copies.append((stat.st_atime, stat.st_size, path))
+        return copies
+
+    def partials(self):
+        """Return a list of (size, path) of the copies being made.
+
+        Must be called with the lock of the directory held. Partial copies
+        left by jobs that are no longer running are deleted.
+        """
+        partials = []
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if not filename.endswith(partial_suffix):
+                    continue
+                path = os.path.join(dirpath, filename)
+                # Named {copy}.{process ID}.partial
+                pid = filename[:-len(partial_suffix)].rsplit(".", 1)[-1]
+                try:
+                    if not _running(int(pid)):
+                        log.info("Deleting stale partial copy `{0}`".format(
+                            path
+                        ))
+                        os.remove(path)
+                        continue
+                    partials.append((os.path.getsize(path), path))
+                except (ValueError, OSError):
+                    continue
+        return partials
+
+    def evict(self, size, reserve=None):
+        """Delete the least recently used copies to make room for size.
+
+        Copies being staged, or in use by any job, are skipped, and the
+        partial copies of other jobs count as used.
+        Keyword arguments:
+        size -- Size in bytes to make room for
+        reserve -- Path of a file to create, of the given size, while the
+            lock is held, so that the room is taken (default: None)
+        """
+        with open(os.path.join(self.directory, lock_name), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            copies = sorted(self.copies())
+            used = (sum(s for t, s, p in copies) +
+                    sum(s for s, p in self.partials()))
+            for last_use, copy_size, path in copies:
+                if used + size <= self.quota:
+                    break
+                if self._evict_copy(path):
+                    used -= copy_size
+            if used + size > self.quota:
+                log.warning("Staging area over quota, copies are in use")
+            if reserve is not None:
+                with open(reserve, "wb") as f:
+                    f.truncate(size)
+
+    def _evict_copy(self, path):
+        """Delete the copy at path, returning False if it is in use."""
+        with open(path + lock_suffix, "a") as lock:
+            if not utilities.try_flock(lock, fcntl.LOCK_EX):
+                return False
+            try:
+                with open(path) as copy:
+                    if not utilities.try_flock(copy, fcntl.LOCK_EX):
+                        return False
+                    log.info("Evicting staged file `{0}`".format(path))
+                    os.remove(path)
+            except (IOError, OSError):
+                # Already deleted
+                pass
+        return True
+
+    def stage(self, path):
+        """Return the path to an up to date local copy of the file at path.
+
+        The copy is in use, so is not evicted, until the process exits or
+        calls `release`.
+        The path itself is returned if the file does not exist, or is
+        larger than the quota.
+        """
+        try:
+            source = os.stat(path)
+        except OSError:
+            return path
+        if source.st_size > self.quota:
+            log.warning("Not staging `{0}`, larger than the quota".format(
+                path
+            ))
+            return path
+        local = self.local_path(path)
+        utilities.make_dirs(os.path.dirname(local))
+        with open(local + lock_suffix, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._update(path, source, local)
+            # Taken before releasing the lock of the copy, so that no job
+            # can evict it in between
+            copy = open(local)
+            fcntl.flock(copy, fcntl.LOCK_SH)
+        self.release(local)
+        self.in_use[local] = copy
+        return local
+
+    def release(self, path):
+        """Release the copy at path, which may then be evicted."""
+        copy = self.in_use.pop(path, None)
+        if copy is not None:
+            copy.close()
+
+    def _update(self, path, source, local):
+        """Copy path to local if needed, and mark local as used now.
+
+        Must be called with the lock of the copy held.
+        """
+        try:
+            copy = os.stat(local)
+            valid = (copy.st_size == source.st_size and
+                     int(copy.st_mtime) == int(source.st_mtime))
+        except OSError:
+            valid = False
+        if not valid:
+            # An out of date copy is replaced by the rename below, rather
+            # than deleted, as other jobs may still be using it
+            # Copy under a temporary name, so no job sees a partial copy
+            partial = "{0}.{1}{2}".format(local, os.getpid(), partial_suffix)
+            self.evict(source.st_size, reserve=partial)
+            log.info("Staging `{0}` to `{1}`".format(path, local))
+            try:
+                # Written in place, so that the file keeps its reserved size
+                with open(path, "rb") as f, open(partial, "r+b") as copy:
+                    shutil.copyfileobj(f, copy, 16*1024*1024)
+                shutil.copystat(path, partial)
+            except (IOError, OSError):
+                os.remove(partial)
+                raise
+            os.rename(partial, local)
+        # The access time records the last use, for the LRU eviction; the
+        # modification time is kept equal to the original's
+        os.utime(local, (time.time(), source.st_mtime))
+
+
+# Area created on first use by `stage`
+_area = None
+
+
+def area():
+    """Return the StagingArea of config.staging_dir, or None if disabled."""
+    global _area
+    if _area is None and config.use_staging and config.staging_dir:
+        _area = StagingArea(
+            config.staging_dir, config.staging_quota, config.work_data_dir
+        )
+    return _area
+
+
+def stage(path):
+    """Return the path to a local copy of the file at path, if enabled.
+
+    If staging is disabled, path is returned.
+    """
+    staging_area = area()
+    if staging_area is None:
+        return path
+    return staging_area.stage(path)
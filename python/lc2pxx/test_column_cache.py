@@ -0,0 +1,169 @@
+"""
+Tests for lc2pxx.column_cache, and its use by Ntuple.arrays.
+
+These tests can be run through the Nose testing framework.
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from lc2pxx import config, column_cache
+
+
+class CacheTest:
+    """Column cache in a temporary directory, reading fake branches.
+
+    Each branch holds the values read_values[branch], and the branches
+    read are recorded in reads.
+    """
+    def __init__(self, quota=None):
+        self.directory = tempfile.mkdtemp(prefix="test_column_cache-")
+        self.read_values = {}
+        self.reads = []
+        self.saved = (
+            config.column_cache_dir, config.column_cache_quota,
+            column_cache.read_branch
+        )
+        config.column_cache_dir = os.path.join(self.directory, "columns")
+        config.column_cache_quota = quota
+        column_cache.read_branch = self.read_branch
+
+    def read_branch(self, path, tree, branch):
+        """Replaces column_cache.read_branch."""
+        self.reads.append((path, tree, branch))
+        return self.read_values.get(branch)
+
+    def source(self, name, contents, mtime=1e9):
+        """Return the path to a new source file."""
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(contents)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def cleanup(self):
+        (config.column_cache_dir, config.column_cache_quota,
+         column_cache.read_branch) = self.saved
+        shutil.rmtree(self.directory)
+
+
+def test_invalidation():
+    """Columns are read once, and again if the file's size or mtime change."""
+    test = CacheTest()
+    try:
+        test.read_values = {"x": np.arange(5.), "arr": None}
+        path = test.source("a.root", "a")
+        values = column_cache.column(path, "T", "x")
+        assert list(values) == range(5)
+        assert not values.flags.writeable
+        assert list(column_cache.column(path, "T", "x")) == range(5)
+        assert len(test.reads) == 1
+
+        # Uncacheable branches are only read once too
+        assert column_cache.column(path, "T", "arr") is None
+        assert column_cache.column(path, "T", "arr") is None
+        assert len(test.reads) == 2
+
+        # Another tree of the same file is cached separately
+        column_cache.column(path, "U", "x")
+        assert len(test.reads) == 3
+
+        # Modification time changes
+        test.read_values["x"] = np.arange(3.)
+        test.source("a.root", "a", mtime=2e9)
+        assert list(column_cache.column(path, "T", "x")) == range(3)
+        assert len(test.reads) == 4
+        # Size changes, with the same modification time
+        test.read_values["x"] = np.arange(4.)
+        test.source("a.root", "ab", mtime=2e9)
+        assert list(column_cache.column(path, "T", "x")) == range(4)
+        assert len(test.reads) == 5
+        # The earlier mapping is still valid
+        assert list(values) == range(5)
+    finally:
+        test.cleanup()
+
+
+def test_evict():
+    """The least recently used directories not in use are cleared first."""
+    # Room for the columns of two files
+    size = np.arange(100.).nbytes
+    test = CacheTest(quota=2*size + 1000)
+    try:
+        test.read_values = {"x": np.arange(100.)}
+        paths = [test.source(n, n) for n in ("a", "b", "c", "d")]
+        lock_paths = [column_cache.lock_path(p, "T") for p in paths]
+
+        def cached(i):
+            """Return True if the column of paths[i] is cached."""
+            directory = lock_paths[i][:-len(".lock")]
+            return os.path.exists(os.path.join(directory, "x.npy"))
+
+        def use(i, last_use):
+            """Cache the column of paths[i], setting its last use."""
+            column_cache.column(paths[i], "T", "x")
+            os.utime(lock_paths[i], (last_use, last_use))
+
+        use(0, 1)
+        use(1, 2)
+        # a is the least recently used
+        use(2, 3)
+        assert [cached(i) for i in range(4)] == [False, True, True, False]
+
+        # b is the least recently used, but in use by another job
+        with open(lock_paths[1], "a") as lock:
+            column_cache.cache_dir(paths[1], "T", lock)
+            use(3, 4)
+        assert [cached(i) for i in range(4)] == [False, True, False, True]
+    finally:
+        test.cleanup()
+
+
+def test_ntuple_arrays():
+    """Cached arrays are indexed by the entries passing cuts and selection."""
+    try:
+        import ROOT
+    except ImportError:
+        return  # Ntuples need ROOT
+    from lc2pxx.Ntuple import Ntuple
+
+    test = CacheTest()
+    # The real branches are read
+    column_cache.read_branch = test.saved[2]
+    try:
+        # Two files, so that the entries span both trees of the chain
+        for n, offset in (("a.root", 0), ("b.root", 100)):
+            f = ROOT.TFile(os.path.join(test.directory, n), "recreate")
+            t = ROOT.TTree("T", "T")
+            x = np.zeros(1)
+            t.Branch("x", x, "x/D")
+            for i in xrange(100):
+                x[0] = offset + i
+                t.Fill()
+            t.Write()
+            f.Close()
+        ntuple = Ntuple("T")
+        for n in ("a.root", "b.root"):
+            ntuple.add(os.path.join(test.directory, n))
+        all_x = np.arange(200.)
+        use_column_cache = config.use_column_cache
+        try:
+            for use_cache in (False, True):
+                config.use_column_cache = use_cache
+                assert list(ntuple.arrays(["x"])["x"]) == list(all_x)
+                assert list(ntuple.arrays(["x"], "x % 3 == 0")["x"]) == list(
+                    all_x[all_x % 3 == 0]
+                )
+                selected = ntuple.copy_selected("x > 50 && x < 150")
+                expected = all_x[(all_x > 50) & (all_x < 150)]
+                assert list(selected.arrays(["x"])["x"]) == list(expected)
+                assert list(
+                    selected.arrays(["x"], "x % 2 == 0")["x"]
+                ) == list(expected[expected % 2 == 0])
+        finally:
+            config.use_column_cache = use_column_cache
+    finally:
+        test.cleanup()
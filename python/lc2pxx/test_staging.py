@@ -0,0 +1,137 @@
+"""
+Tests for lc2pxx.staging.
+
+These tests can be run through the Nose testing framework.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+
+from lc2pxx import staging
+
+
+def make_area(quota):
+    """Return a StagingArea of quota bytes, and its source directory."""
+    directory = tempfile.mkdtemp(prefix="test_staging-")
+    source_dir = os.path.join(directory, "work")
+    os.makedirs(source_dir)
+    area = staging.StagingArea(
+        os.path.join(directory, "area"), quota, source_dir
+    )
+    return area, source_dir
+
+
+def write(path, contents, mtime=None):
+    """Write contents to the file at path, setting its modification time."""
+    with open(path, "wb") as f:
+        f.write(contents)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_stage():
+    """Copies are made once, reused, and replaced if the original changes."""
+    area, source_dir = make_area(1000)
+    try:
+        path = os.path.join(source_dir, "sub", "a.root")
+        os.makedirs(os.path.dirname(path))
+        write(path, "a"*100, mtime=1e9)
+        local = area.stage(path)
+        # The layout of the source directory is mirrored
+        assert local == os.path.join(area.directory, "sub", "a.root")
+        assert open(local).read() == "a"*100
+        assert int(os.stat(local).st_mtime) == int(1e9)
+
+        # Reused if up to date
+        inode = os.stat(local).st_ino
+        assert area.stage(path) == local
+        assert os.stat(local).st_ino == inode
+        assert len(area.in_use) == 1
+
+        # Replaced if the modification time changes, even with the same
+        # size
+        write(path, "b"*100, mtime=2e9)
+        assert area.stage(path) == local
+        assert open(local).read() == "b"*100
+
+        # Files that don't exist, or are over the quota, aren't staged
+        missing = os.path.join(source_dir, "missing.root")
+        assert area.stage(missing) == missing
+        large = os.path.join(source_dir, "large.root")
+        write(large, "c"*2000)
+        assert area.stage(large) == large
+        # No partial copies are left
+        assert area.partials() == []
+    finally:
+        shutil.rmtree(os.path.dirname(area.directory))
+
+
+def test_evict():
+    """The least recently used copies not in use are evicted first."""
+    area, source_dir = make_area(250)
+    try:
+        paths = [os.path.join(source_dir, n) for n in ("a", "b", "c", "d")]
+        for path in paths:
+            write(path, "x"*100)
+        now = time.time()
+        locals_ = []
+        for i, path in enumerate(paths[:2]):
+            locals_.append(area.stage(path))
+            area.release(locals_[-1])
+            # Last uses in the order of staging
+            os.utime(locals_[-1], (now - 100 + i, os.stat(path).st_mtime))
+
+        # a is the least recently used
+        area.stage(paths[2])
+        assert not os.path.exists(locals_[0])
+        assert os.path.exists(locals_[1])
+
+        # b is in use by another job, here another area, so c is evicted
+        other = staging.StagingArea(area.directory, area.quota, source_dir)
+        other.stage(paths[1])
+        area.release(area.local_path(paths[2]))
+        os.utime(area.local_path(paths[2]), (now + 100, now))
+        area.stage(paths[3])
+        assert os.path.exists(locals_[1])
+        assert not os.path.exists(area.local_path(paths[2]))
+
+        # With both copies in use, the quota is exceeded rather than
+        # deleting a copy in use
+        area.stage(paths[0])
+        assert os.path.exists(locals_[1])
+        assert os.path.exists(area.local_path(paths[3]))
+        assert os.path.exists(area.local_path(paths[0]))
+        other.release(locals_[1])
+    finally:
+        shutil.rmtree(os.path.dirname(area.directory))
+
+
+def test_partials():
+    """Partial copies count as used, and stale ones are deleted."""
+    area, source_dir = make_area(250)
+    try:
+        # Reserved by a running job, here this one
+        running = os.path.join(
+            area.directory, "a.{0}.partial".format(os.getpid())
+        )
+        write(running, "x"*100)
+        # Left by a job that is no longer running
+        stale = os.path.join(area.directory, "b.99999999.partial")
+        write(stale, "x"*100)
+        assert area.partials() == [(100, running)]
+        assert not os.path.exists(stale)
+
+        path = os.path.join(source_dir, "c")
+        write(path, "x"*100)
+        local = area.stage(path)
+        area.release(local)
+        os.utime(local, (0, os.stat(path).st_mtime))
+        # The reserved 100 bytes leave room for one copy only
+        other = os.path.join(source_dir, "d")
+        write(other, "x"*100)
+        area.stage(other)
+        assert not os.path.exists(local)
+    finally:
+        shutil.rmtree(os.path.dirname(area.directory))
@@ -4,68 +4,132 @@ Useful functions.
 """
 
 import os
+import errno
+import fcntl
 import sys
+import time
 import logging as log
-import tempfile
 import random
 import re
 from math import sqrt
 
-import ROOT
 from uncertainties import ufloat
 
 import lc2pxx
 
 def quiet_mode():
     """Enables ROOT batch mode (no X windows) and sets no INFO logging."""
+    # ROOT is imported only where needed, as importing it is slow
+    import ROOT
     # Enable batch mode -> no X windows
     ROOT.gROOT.SetBatch(True)
     # Disable INFO level logging, i.e. WARNING and up
     ROOT.gErrorIgnoreLevel = ROOT.kWarning
     log.info("Quiet mode enabled")
 
-def progress_bar(fraction):
-    """Prints a progress bar filled proportionally to fraction.
 
-    Keyword arguments:
-    fraction -- Float between 0 and 1.
+class ProgressBar:
+    """Progress bar of a loop over items, with the throughput and ETA.
+
+    The bar is redrawn at most once per `interval` seconds, and the time
+    is only checked every `stride` items, so that loops pay just an
+    integer comparison per item between updates:
+
+        bar = ProgressBar(entries)
+        next_update = bar.next_update
+        for i in xrange(entries):
+            if i >= next_update:
+                next_update = bar.update(i)
+            ...
+        bar.finish()
+
+    Chunked or parallel loops can instead call `add` with the number of
+    items completed by each chunk. Nothing is printed if the stream is
+    not a terminal, e.g. in batch jobs or when the output is redirected.
     """
-    width = 20
-    percent = int(100*fraction)
-    if percent % 5 != 0: return
-    filled = percent/5
-    sys.stdout.write("\r")
-    sys.stdout.write("[{0}{1}] {2}%".format(
-        "#"*filled,
-        " "*(width - filled),
-        percent
-    ))
-    sys.stdout.flush()
+    def __init__(self, total, stride=None, interval=0.5, stream=None):
+        """Initialise a ProgressBar.
+
+        Keyword arguments:
+        total -- Total number of items
+        stride -- Number of items between checks of the time
+            (default: 0.1% of the total)
+        interval -- Minimum number of seconds between redraws (default: 0.5)
+        stream -- File to draw the bar on (default: sys.stdout)
+        """
+        self.total = total
+        self.stride = stride or max(1, total//1000)
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.enabled = self.stream.isatty()
+        # Number of items done
+        self.done = 0
+        # Item count at which update next needs calling
+        self.next_update = 0 if self.enabled else sys.maxint
+        self.start = self.drawn = time.time()
+
+    def update(self, done):
+        """Set the number of items done, returning the next update count.
+
+        The bar is redrawn if at least `interval` seconds have passed.
+        """
+        self.done = done
+        if not self.enabled:
+            return self.next_update
+        self.next_update = done + self.stride
+        now = time.time()
+        if now - self.drawn >= self.interval:
+            self.drawn = now
+            self.draw(now)
+        return self.next_update
+
+    def add(self, items):
+        """Add items to the number done, returning the next update count."""
+        done = self.done + items
+        if done >= self.next_update:
+            return self.update(done)
+        self.done = done
+        return self.next_update
+
+    def draw(self, now=None):
+        """Draw the bar, with the throughput and estimated time remaining."""
+        width = 20
+        elapsed = (now or time.time()) - self.start
+        fraction = min(1., 1.*self.done/self.total) if self.total else 1.
+        filled = int(width*fraction)
+        rate = self.done/elapsed if elapsed > 0 else 0.
+        eta = (self.total - self.done)/rate if rate > 0 else 0.
+        bar = "#"*filled + " "*(width - filled)
+        self.stream.write("\r[{0}] {1:3.0f}% {2:.0f}/s ETA {3:.0f} s".format(
+            bar, 100*fraction, rate, eta
+        ))
+        self.stream.flush()
+
+    def finish(self):
+        """Draw the completed bar, and end its line."""
+        if not self.enabled:
+            return
+        self.done = max(self.done, self.total)
+        self.draw()
+        self.stream.write("\n")
+        self.stream.flush()
 
 
 def create_temp_file():
-    """Return a temporary TFile, to be deleted by the user."""
-    dir = tempfile.mkdtemp()
-    # TODO not particular useful if we have more than one temp file...
-    filename = dir + "/tmp.root"
-    log.info("Creating temporary TFile `{0}`".format(filename))
-    return ROOT.TFile(filename, "recreate")
+    """Return a temporary TFile, to be deleted with `delete_temp_file`.
+
+    The file is uniquely named, in the scratch space of the process, and
+    is deleted at exit if not before; see lc2pxx.scratch.
+    """
+    # Imported here as lc2pxx.scratch depends on config, which imports us
+    from lc2pxx import scratch
+    return scratch.default_space().create_file()
 
 
 def delete_temp_file(file):
     """Deletes files created by `create_temp_file`."""
-    filename = file.GetEndpointUrl().GetFile()
-    # Prevent accidental deletion of non-temporary files
-    if filename.startswith(("/var", "/tmp")):
-        log.info("Deleting temporary TFile `{0}`".format(filename))
-        try:
-            os.remove(filename)
-        except OSError:
-            log.error("Could not remove file at `{0}`".format(filename))
-    else:
-        log.error("Refusing to delete 'temporary' file `{0}`".format(
-            filename
-        ))
+    from lc2pxx import scratch
+    scratch.default_space().delete(file)
 
 
 def save_to_file(filename, objects):
@@ -76,6 +140,7 @@ def save_to_file(filename, objects):
         If filename already exists, it is overwritten.
     objects -- List of objects implementing TObject.Write.
     """
+    import ROOT
     file = ROOT.TFile(filename, "recreate")
     for object in objects: object.Write()
     file.Write()
@@ -88,6 +153,34 @@ def file_exists(path):
     return os.path.exists(os.path.expandvars(path))
 
 
+def make_dirs(path):
+    """Create the directory at path and its parents, if they don't exist.
+
+    Unlike os.makedirs, doesn't fail if another job creates it first.
+    """
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+def try_flock(f, operation):
+    """Return True if the flock operation on f succeeds without waiting.
+
+    Keyword arguments:
+    f -- Open file to lock
+    operation -- fcntl.LOCK_SH or fcntl.LOCK_EX
+    """
+    try:
+        fcntl.flock(f, operation | fcntl.LOCK_NB)
+    except IOError as e:
+        if e.errno not in (errno.EAGAIN, errno.EACCES):
+            raise
+        return False
+    return True
+
+
 def latex_mode(mode):
     """Return the LaTeX string corresponding to the mode."""
     try:
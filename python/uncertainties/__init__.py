@@ -257,7 +257,10 @@ __all__ = [
     # Uniform access to nominal values and standard deviations:
     'nominal_value',
     'std_dev',
-    
+
+    # Sum of many numbers with uncertainties:
+    'usum',
+
     # Utility functions (more are exported if NumPy is present):
     'covariance_matrix',
     
@@ -349,7 +352,43 @@ else:
     # for instance Numerical Recipes: (1) reduction to tri-diagonal
     # [Givens or Householder]; (2) QR / QL decomposition.
     
-    def correlated_values(nom_values, covariance_mat, tags=None):
+    # Maximum number of covariance matrices whose diagonalization is
+    # kept by _diagonalize():
+    DIAGONALIZATION_CACHE_SIZE = 16
+
+    # Maps (shape, bytes) of covariance matrices to their
+    # diagonalization, least recently used first:
+    _diagonalizations = collections.OrderedDict()
+
+    def _diagonalize(covariance_mat):
+        """
+        Returns the variances and eigenvectors (as columns) of the given
+        covariance matrix, with negative variances set to zero.
+
+        The results for the last DIAGONALIZATION_CACHE_SIZE matrices are
+        kept, as the same matrix (e.g. of a fit result) is often used
+        repeatedly. The returned arrays must not be modified.
+        """
+
+        covariance_mat = numpy.ascontiguousarray(covariance_mat, float)
+        key = (covariance_mat.shape, covariance_mat.tostring())
+
+        try:
+            diagonalization = _diagonalizations.pop(key)
+        except KeyError:
+            (variances, transform) = numpy.linalg.eigh(covariance_mat)
+            # Numerical errors might make some variances negative: we
+            # set them to zero:
+            variances[variances < 0] = 0.
+            diagonalization = (variances, transform)
+            if len(_diagonalizations) >= DIAGONALIZATION_CACHE_SIZE:
+                _diagonalizations.popitem(last=False)
+
+        _diagonalizations[key] = diagonalization  # Most recently used
+        return diagonalization
+
+    def correlated_values(nom_values, covariance_mat, tags=None,
+                          dense=False):
         """
         Returns numbers with uncertainties (AffineScalarFunc objects)
         that correctly reproduce the given covariance matrix, and have
@@ -375,6 +414,12 @@ else:
         matrix, i.e., not the normalized covariance matrix). For
         example, the first element of this matrix is the variance of
         the first returned number with uncertainty.
+
+        dense -- if True, the values are returned as a single
+        unumpy.dense.DenseUArray, whose Jacobian is the matrix of
+        eigenvectors of the covariance matrix. No object is created
+        per value, which is much faster for large matrices (elements
+        of the array are numbers with uncertainties).
         """
 
         # If no tags were given, we prepare tags for the newly created
@@ -385,33 +430,34 @@ else:
         # The covariance matrix is diagonalized in order to define
         # the independent variables that model the given values:
 
-        (variances, transform) = numpy.linalg.eigh(covariance_mat)
+        (variances, transform) = _diagonalize(covariance_mat)
 
-        # Numerical errors might make some variances negative: we set
-        # them to zero:
-        variances[variances < 0] = 0.
-        
         # Creation of new, independent variables:
 
         # We use the fact that the eigenvectors in 'transform' are
         # special: 'transform' is unitary: its inverse is its transpose:
 
-        variables = tuple(
+        variables = [
             # The variables represent "pure" uncertainties:
-            Variable(0, sqrt(variance), tag)
-            for (variance, tag) in zip(variances, tags))
+            Variable(0, std_dev, tag)
+            for (std_dev, tag) in zip(numpy.sqrt(variances).tolist(), tags)]
+
+        if dense:
+            # Imported here, as unumpy imports this module:
+            from uncertainties.unumpy.dense import DenseUArray
+            return DenseUArray(nom_values, transform.copy(), variables)
 
         # Representation of the initial correlated values:
         values_funcs = tuple(
             AffineScalarFunc(value, dict(zip(variables, coords)))
-            for (coords, value) in zip(transform, nom_values))
+            for (coords, value) in zip(transform.tolist(), nom_values))
 
         return values_funcs
 
     __all__.append('correlated_values')
 
     def correlated_values_norm(values_with_std_dev, correlation_mat,
-                               tags=None):
+                               tags=None, dense=False):
         '''
         Returns correlated values like correlated_values(), but takes
         instead as input:
@@ -427,6 +473,8 @@ else:
 
         correlation_mat -- correlation matrix (i.e. the normalized
         covariance matrix, a matrix with ones on its diagonal).
+
+        dense -- as for correlated_values().
         '''
 
         (nominal_values, std_devs) = numpy.transpose(values_with_std_dev)
@@ -434,7 +482,7 @@ else:
         return correlated_values(
             nominal_values,
             correlation_mat*std_devs*std_devs[numpy.newaxis].T,
-            tags)
+            tags, dense)
         
     __all__.append('correlated_values_norm')
     
@@ -605,7 +653,7 @@ class IndexableIter(object):
             self.__class__.__name__,
             ', '.join(map(str, self.returned_elements)))
     
-def wrap(f, derivatives_args=[], derivatives_kwargs={}):
+def wrap(f, derivatives_args=[], derivatives_kwargs={}, cache_size=0):
     """
     Wraps a function f into a function that also accepts numbers with
     uncertainties (UFloat objects); the wrapped function returns the
@@ -685,7 +733,19 @@ def wrap(f, derivatives_args=[], derivatives_kwargs={}):
         is immaterial: for example, if f has signature f(a, b=None),
         then derivatives_kwargs should be the empty dictionary, even
         if the wrapped f can be called a wrapped_f(a=123, b=42).
-        
+
+    cache_size --
+
+        If non-zero, the value of f and its derivatives are memoized
+        for the cache_size most recently used sets of arguments (with
+        numbers with uncertainty replaced by their nominal value).
+        This is useful when f is expensive and called repeatedly with
+        the same nominal values (for instance with different
+        uncertainties), since each numerical derivative calls f twice.
+        The cache must only be used if f always returns the same
+        value for the same arguments. Unhashable arguments are not
+        cached.
+
     Example (for illustration purposes only, as
     uncertainties.umath.sin() runs faster than the examples that
     follow): wrap(math.sin) is a sine function that can be applied to
@@ -703,7 +763,10 @@ def wrap(f, derivatives_args=[], derivatives_kwargs={}):
     handle some arguments even when they have an uncertainty, the
     wrapped function ignores this fact, which might lead to a
     performance hit: wrapping a function that actually accepts numbers
-    with uncertainty is likely to make it slower.
+    with uncertainty is likely to make it slower. Derivatives are only
+    calculated with respect to the arguments that depend on variables:
+    float arguments (and constant numbers with uncertainty) cost no
+    derivative calculation.
     """
 
     derivatives_args_index = IndexableIter(
@@ -784,6 +847,78 @@ def wrap(f, derivatives_args=[], derivatives_kwargs={}):
     derivatives_args_index.none_converter = none_converter
 
     
+    ## Value and derivatives of f:
+
+    def value_and_derivatives(args_values, kwargs, arguments_w_uncert):
+        """
+        Returns the value of f at the given (float) arguments, along
+        with the list of its partial derivatives with respect to the
+        arguments in arguments_w_uncert, a list of (argument
+        reference, original value) pairs, where argument references
+        are indices in args_values or names in kwargs.
+
+        The list of derivatives is None if the value of f is not a
+        float (they cannot be used, then).
+        """
+
+        f_value = f(*args_values, **kwargs)
+
+        if not isinstance(f_value, FLOAT_LIKE_TYPES):
+            return (f_value, None)
+
+        f_derivatives = []
+        for (arg_ref, value) in arguments_w_uncert:
+
+            if isinstance(arg_ref, basestring):
+                # Optimization: caching of the automatic numerical
+                # derivatives for keyword arguments that are
+                # discovered. This gives a speedup when the original
+                # function is called repeatedly with the same keyword
+                # arguments:
+                derivative = derivatives_all_kwargs.setdefault(
+                    arg_ref,
+                    # Derivative never needed before:
+                    partial_derivative(f, arg_ref))
+            else:
+                derivative = derivatives_args_index[arg_ref]
+
+            f_derivatives.append(derivative(*args_values, **kwargs))
+
+        return (f_value, f_derivatives)
+
+    if cache_size:
+
+        # {(args, kwargs, argument references): (value, derivatives)},
+        # from the least to the most recently used:
+        derivatives_cache = collections.OrderedDict()
+
+        def cached_value_and_derivatives(args_values, kwargs,
+                                         arguments_w_uncert):
+            """
+            Same as value_and_derivatives(), but with the results for
+            the cache_size most recently used arguments memoized.
+            """
+            try:
+                key = (tuple(args_values), frozenset(kwargs.iteritems()),
+                       tuple(arg_ref for (arg_ref, value)
+                             in arguments_w_uncert))
+                result = derivatives_cache.pop(key)
+            except TypeError:
+                # Unhashable arguments (lists, etc.) cannot be cached:
+                return value_and_derivatives(args_values, kwargs,
+                                             arguments_w_uncert)
+            except KeyError:
+                result = value_and_derivatives(args_values, kwargs,
+                                               arguments_w_uncert)
+                if len(derivatives_cache) >= cache_size:
+                    derivatives_cache.popitem(last=False)
+
+            derivatives_cache[key] = result  # Most recently used
+            return result
+
+    else:
+        derivatives_cache = None
+
     ## Wrapped function:
 
     #! Setting the doc string after "def f_with...()" does not
@@ -857,20 +992,21 @@ def wrap(f, derivatives_args=[], derivatives_kwargs={}):
             kwargs_uncert_values[name] = value_with_uncert
             # The original dictionary is modified (for efficiency reasons):
             kwargs[name] = value_with_uncert.nominal_value
-            
-        f_nominal_value = f(*args_values, **kwargs)
 
-        # If the value is not a float, then this code cannot provide
-        # the result, as it returns a UFloat, which represents a
-        # random real variable. This happens for instance when
-        # ufloat()*numpy.array() is calculated: the
-        # AffineScalarFunc.__mul__ operator, obtained through wrap(),
-        # returns a NumPy array, not a float:
-        if not isinstance(f_nominal_value, FLOAT_LIKE_TYPES):
-            return NotImplemented
-        
-        ########################################
+        ## Arguments that actually depend on variables:
 
+        # Constant numbers with uncertainty (like the result of
+        # to_affine_scalar(1.)) have no linear part: like floats, they
+        # need no derivative.
+        arguments_w_uncert = [
+            (pos, args[pos]) for pos in pos_w_uncert
+            if args[pos]._linear_part.linear_combo]
+        if names_w_uncert:
+            arguments_w_uncert.extend(
+                (name, kwargs_uncert_values[name]) for name in names_w_uncert
+                if kwargs_uncert_values[name]._linear_part.linear_combo)
+
+        ########################################
         # The chain rule will be applied.  In the case of numerical
         # derivatives, this method gives a better-controlled numerical
         # stability than numerically calculating the partial
@@ -879,71 +1015,43 @@ def wrap(f, derivatives_args=[], derivatives_kwargs={}):
         # 'a' by 'da'.  In fact, this allows the program to control
         # how big the dx, dy, etc. are, which is numerically more
         # precise.
-        
-        ########################################
-            
-        # Calculation of the derivatives with respect to the variables
-        # of f that have a number with uncertainty.
-        
-        # Mappings of each relevant argument reference (numerical
-        # index in args, or name in kwargs to the value of the
-        # corresponding partial derivative of f (only for those
-        # arguments that contain a number with uncertainty).
-        
-        derivatives_num_args = {}
 
-        for pos in pos_w_uncert:
-            derivatives_num_args[pos] = derivatives_args_index[pos](
-                *args_values, **kwargs)
-
-        derivatives_num_kwargs = {}
-        for name in names_w_uncert:
-
-            # Optimization: caching of the automatic numerical
-            # derivatives for keyword arguments that are
-            # discovered. This gives a speedup when the original
-            # function is called repeatedly with the same keyword
-            # arguments:
-            derivative = derivatives_all_kwargs.setdefault(
-                name,
-                # Derivative never needed before:
-                partial_derivative(f, name))
+        if derivatives_cache is None:
+            (f_nominal_value, f_derivatives) = value_and_derivatives(
+                args_values, kwargs, arguments_w_uncert)
+        else:
+            (f_nominal_value, f_derivatives) = cached_value_and_derivatives(
+                args_values, kwargs, arguments_w_uncert)
 
-            derivatives_num_kwargs[name] = derivative(
-                *args_values, **kwargs)
+        # If the value is not a float, then this code cannot provide
+        # the result, as it returns a UFloat, which represents a
+        # random real variable. This happens for instance when
+        # ufloat()*numpy.array() is calculated: the
+        # AffineScalarFunc.__mul__ operator, obtained through wrap(),
+        # returns a NumPy array, not a float:
+        if f_derivatives is None:
+            return NotImplemented
 
         ########################################
         # Calculation of the derivative of f with respect to all the
         # variables (Variable objects) involved.
 
-        # Involved variables (Variable objects):
-        variables = set()
-        
-        for expr in itertools.chain(
-            (args[index] for index in pos_w_uncert),  # From args
-            kwargs_uncert_values.itervalues()):  # From kwargs
-            
-            # !! In Python 2.7+: |= expr.derivatives.viewkeys()
-            variables |= set(expr.derivatives)
-        
-        # Initial value for the chain rule (is updated below):
-        derivatives_wrt_vars = dict((var, 0.) for var in variables)
-
-        ## The chain rule is used...
+        # The chain rule is not applied right away: the result only
+        # records the derivatives of f with respect to its arguments,
+        # along with the linear parts of these arguments. The
+        # derivatives with respect to the variables are only
+        # calculated when they are needed (see LinearCombination), so
+        # that intermediate results of a calculation never have their
+        # derivatives expanded.
 
-        # ... on args:
-        for (pos, f_derivative) in derivatives_num_args.iteritems():
-            for (var, arg_derivative) in args[pos].derivatives.iteritems():
-                derivatives_wrt_vars[var] += f_derivative * arg_derivative
-        # ... on kwargs:
-        for (name, f_derivative) in derivatives_num_kwargs.iteritems():
-            for (var, arg_derivative) in (kwargs_uncert_values[name]
-                                          .derivatives.iteritems()):
-                derivatives_wrt_vars[var] += f_derivative * arg_derivative
+        linear_part = [
+            (f_derivative, value._linear_part)
+            for (f_derivative, (arg_ref, value))
+            in zip(f_derivatives, arguments_w_uncert)]
 
-                
-        # The function now returns an AffineScalarFunc object:        
-        return AffineScalarFunc(f_nominal_value, derivatives_wrt_vars)
+        # The function now returns an AffineScalarFunc object:
+        return AffineScalarFunc(f_nominal_value,
+                                LinearCombination(linear_part))
 
     # It is easier to work with f_with_affine_output, which represents
     # a wrapped version of 'f', when it bears the same name as
@@ -1063,12 +1171,118 @@ class CallableStdDev(float):
     callable. Provided for compatibility with old code. Issues an
     obsolescence warning upon call.
     '''
-    
+
+    # Every Variable holds one: without this, each instance would carry
+    # a (mostly empty) __dict__, and be three times as large as a float.
+    __slots__ = ()
+
     def __call__ (self):
         deprecation('the std_dev attribute should not be called'
                     ' anymore: use .std_dev instead of .std_dev().')
         return self
-        
+
+class LinearCombination(object):
+    """
+    Linear part of an AffineScalarFunc, possibly in a non-expanded
+    form.
+
+    The linear_combo attribute is either:
+
+    - a dictionary that maps each Variable object to the derivative
+      with respect to it (expanded form), or
+
+    - a list of (factor, LinearCombination) pairs, that represents the
+      sum of factor*linear combination (non-expanded form).
+
+    Calculations only build non-expanded linear combinations, which
+    takes a time independent of the number of variables involved. The
+    derivatives with respect to the variables are only calculated, by
+    expand(), when they are needed (typically for the standard
+    deviation of the final result of a calculation).
+    """
+
+    # There are many linear combinations (one per number with
+    # uncertainty):
+    __slots__ = ('linear_combo',)
+
+    def __init__(self, linear_combo):
+        """
+        linear_combo -- dictionary or list, as described in the class
+        documentation.
+        """
+        self.linear_combo = linear_combo
+
+    def expanded(self):
+        """
+        Returns True if and only if the linear combination is expanded.
+        """
+        return isinstance(self.linear_combo, dict)
+
+    def expand(self):
+        """
+        Expands the linear combination, in place.
+
+        The derivatives of the linear combinations it depends on are
+        accumulated with the chain rule. Each non-expanded linear
+        combination is only visited once, even if it is shared by
+        several terms, so that the time taken is linear in the size of
+        the graph of the calculation.
+        """
+
+        if self.expanded():
+            return
+
+        # The non-expanded linear combinations are first sorted so
+        # that each one comes after all the linear combinations that
+        # depend on it (depth-first post-order, reversed):
+        post_order = []
+        visited = set()
+        to_visit = [(self, False)]
+        while to_visit:
+            (combo, terms_visited) = to_visit.pop()
+            if terms_visited:
+                post_order.append(combo)
+                continue
+            if id(combo) in visited:
+                continue
+            visited.add(id(combo))
+            to_visit.append((combo, True))
+            # Visiting the terms in reverse order makes the accumulation
+            # of the derivatives below close to that of a direct
+            # application of the chain rule (so that rounding errors
+            # cancel in the same cases, like tan(x) - sin(x)/cos(x)):
+            for (factor, expr) in reversed(combo.linear_combo):
+                if not expr.expanded() and id(expr) not in visited:
+                    to_visit.append((expr, False))
+
+        # The factor of each non-expanded linear combination in self
+        # is then propagated down to the variables:
+        factors = {id(self): 1.}
+        derivatives = collections.defaultdict(float)
+        for combo in reversed(post_order):
+            combo_factor = factors.pop(id(combo))
+            for (factor, expr) in combo.linear_combo:
+                if expr.expanded():
+                    for (var, derivative) in expr.linear_combo.iteritems():
+                        derivatives[var] += combo_factor*factor*derivative
+                else:
+                    factors[id(expr)] = (factors.get(id(expr), 0.)
+                                         + combo_factor*factor)
+
+        self.linear_combo = dict(derivatives)
+
+    def __getstate__(self):
+        """
+        Hook for the pickle module.
+        """
+        return (self.linear_combo,)
+
+    def __setstate__(self, state):
+        """
+        Hook for the pickle module.
+        """
+        (self.linear_combo,) = state
+
 class AffineScalarFunc(object):
     """
     Affine functions that support basic mathematical operations
@@ -1100,12 +1314,21 @@ class AffineScalarFunc(object):
       All the Variable objects on which the function depends are in
       'derivatives'.
 
+      The derivatives are only calculated when first needed (by this
+      attribute, or the standard deviation): they are otherwise held
+      in a non-expanded form (see LinearCombination).
+
     - std_score(x): position of number x with respect to the
       nominal value, in units of the standard deviation.
     """
 
     # To save memory in large arrays:
-    __slots__ = ('_nominal_value', 'derivatives')
+    __slots__ = ('_nominal_value', '_linear_part', '_std_dev_cache')
+
+    # Number of times that the standard deviation of a Variable was
+    # modified. Cached standard deviations calculated before the last
+    # modification are obsolete:
+    _std_dev_epoch = 0
     
     #! The code could be modify in order to accommodate for non-float
     # nominal values.  This could for instance be done through
@@ -1124,7 +1347,8 @@ class AffineScalarFunc(object):
         derivatives -- maps each Variable object on which the function
         being defined depends to the value of the derivative with
         respect to that variable, taken at the nominal value of all
-        variables.
+        variables. A LinearCombination can also be given (it is then
+        used as is).
  
         Warning: the above constraint is not checked, and the user is
         responsible for complying with it.
@@ -1140,7 +1364,27 @@ class AffineScalarFunc(object):
         # be possible.
 
         self._nominal_value = float(nominal_value)
-        self.derivatives = derivatives
+        # Equivalent to setting self.derivatives, without the
+        # overhead of a property (many objects are created):
+        self._linear_part = (
+            derivatives if isinstance(derivatives, LinearCombination)
+            else LinearCombination(derivatives))
+
+    @property
+    def derivatives(self):
+        """
+        Dictionary that maps each Variable object on which the function
+        depends to the derivative with respect to it.
+        """
+        # The derivatives are only calculated once:
+        self._linear_part.expand()
+        return self._linear_part.linear_combo
+
+    @derivatives.setter
+    def derivatives(self, derivatives):
+        self._linear_part = (
+            derivatives if isinstance(derivatives, LinearCombination)
+            else LinearCombination(derivatives))
 
     # The following prevents the 'nominal_value' attribute from being
     # modified by the user:
@@ -1263,14 +1507,22 @@ class AffineScalarFunc(object):
         standard deviations [std_dev] of the variables (Variable
         objects) involved.
         """
-        #! It would be possible to not allow the user to update the
-        #std dev of Variable objects, in which case AffineScalarFunc
-        #objects could have a pre-calculated or, better, cached
-        #std_dev value (in fact, many intermediate AffineScalarFunc do
-        #not need to have their std_dev calculated: only the final
-        #AffineScalarFunc returned to the user does).
-        return CallableStdDev(sqrt(sum(
+        # The standard deviation is cached, until the standard
+        # deviation of any Variable is modified (intermediate
+        # AffineScalarFunc never have their std_dev calculated: only
+        # the final AffineScalarFunc returned to the user does):
+        try:
+            (epoch, std_dev) = self._std_dev_cache
+        except AttributeError:  # Never calculated
+            pass
+        else:
+            if epoch == AffineScalarFunc._std_dev_epoch:
+                return std_dev
+
+        std_dev = CallableStdDev(sqrt(sum(
             delta**2 for delta in self.error_components().itervalues())))
+        self._std_dev_cache = (AffineScalarFunc._std_dev_epoch, std_dev)
+        return std_dev
 
     def _general_representation(self, to_string):
         """
@@ -1393,7 +1645,17 @@ class AffineScalarFunc(object):
                 all_attrs[name] = getattr(self, name)
             except AttributeError:
                 pass  # Undefined slot attribute
-                
+
+        # The cached standard deviation is only valid in this process:
+        all_attrs.pop('_std_dev_cache', None)
+
+        # The linear part is stored expanded, as the derivatives: a
+        # non-expanded linear part can be a deep graph (long chain of
+        # calculations), which pickle would serialize recursively:
+        if '_linear_part' in all_attrs:
+            del all_attrs['_linear_part']
+            all_attrs['derivatives'] = self.derivatives
+
         return all_attrs
 
     def __setstate__(self, data_dict):
@@ -1401,6 +1663,8 @@ class AffineScalarFunc(object):
         Hook for the pickle module.
         """        
         for (name, value) in data_dict.iteritems():
+            # The 'derivatives' setter rebuilds the linear part (as a
+            # LinearCombination) from the stored derivatives:
             setattr(self, name, value)
 
 # Nicer name, for users: isinstance(ufloat(...), UFloat) is
@@ -1694,6 +1958,12 @@ class Variable(AffineScalarFunc):
         assert std_dev >= 0 or isnan(std_dev), (
             "the error must be a positive number, or NaN")
 
+        # The cached standard deviation of the functions of this
+        # variable becomes obsolete (setting the initial standard
+        # deviation of a new variable does not affect any function):
+        if hasattr(self, '_std_dev'):
+            AffineScalarFunc._std_dev_epoch += 1
+
         self._std_dev = CallableStdDev(std_dev)
     
     def _get_std_dev(self):
@@ -1793,6 +2063,36 @@ def std_dev(x):
 
     return x.std_dev if isinstance(x, AffineScalarFunc) else 0.
 
+def usum(values):
+    """
+    Returns the sum of the given values, which can be numbers with
+    uncertainties or floats.
+
+    The result is the same as that of sum(values), but it is obtained
+    in a time proportional to the number of values: the sum only has a
+    single term per value, instead of each partial sum depending on
+    the previous one. The nominal value is calculated with math.fsum(),
+    so it does not suffer from rounding errors.
+
+    If none of the values has an uncertainty, a float is returned.
+    """
+
+    nominal_values = []
+    linear_part = []
+    for value in values:
+        if isinstance(value, AffineScalarFunc):
+            nominal_values.append(value._nominal_value)
+            linear_part.append((1., value._linear_part))
+        else:
+            nominal_values.append(value)
+
+    sum_value = math.fsum(nominal_values)
+
+    if not linear_part:
+        return sum_value
+
+    return AffineScalarFunc(sum_value, LinearCombination(linear_part))
+
 def covariance_matrix(nums_with_uncert):
     """
     Returns a matrix that contains the covariances between the given
@@ -1993,6 +2293,92 @@ def ufloat_fromstr(representation, tag=None):
     (nominal_value, std_dev) = _str_to_number_with_uncert(representation)
     return ufloat(nominal_value, std_dev, tag)
 
+# Spaces around "+/-", in a list of representations of numbers with
+# uncertainty:
+PLUS_MINUS_WITH_SPACES_RE = re.compile(r'[ \t]*\+/-[ \t]*')
+
+# Empty field in a list of representations separated by commas:
+EMPTY_FIELD_RE_SEARCH = re.compile(r',\s*(?:,|$)|^\s*,').search
+
+def parse_numbers_with_uncert(representations):
+    """
+    Returns the list of (value, error) pairs represented in
+    representations, which is either:
+
+    - a string, where the numbers are separated by commas and/or
+      whitespace (including newlines): "1.23+/-0.01, 4.5(6) 7.8",
+
+    - a file object, whose contents are such a string, or
+
+    - a sequence of strings, each representing one number.
+
+    The forms recognized for each number are those of
+    ufloat_fromstr(). This is faster than calling ufloat_fromstr() on
+    each number: the whole text is split in a single pass, and
+    numbers of the form value+/-error are converted without any
+    Python loop.
+
+    Raises ValueError if representations cannot be parsed.
+    """
+
+    if isinstance(representations, basestring):
+        text = representations
+        num_expected = None
+    elif hasattr(representations, 'read'):
+        text = representations.read()
+        num_expected = None
+    else:
+        representations = list(representations)
+        text = '\n'.join(representations)
+        num_expected = len(representations)
+
+    # Optimization: the (relatively slow) regular expressions are only
+    # used when necessary:
+    if ',' in text and EMPTY_FIELD_RE_SEARCH(text):
+        raise ValueError("Empty field in the list of numbers: '%s'"
+                         % text.strip()[:80])
+    if any(spaced in text for spaced in (' +/-', '+/- ', '\t+/-', '+/-\t')):
+        text = PLUS_MINUS_WITH_SPACES_RE.sub('+/-', text)
+
+    tokens = text.replace(',', ' ').split()
+
+    # Each string of a sequence must represent exactly one number:
+    if num_expected is not None and len(tokens) != num_expected:
+        raise ValueError("%d numbers found in a sequence of %d strings"
+                         % (len(tokens), num_expected))
+
+    # (values, separators, errors), with empty separators for numbers
+    # that are not of the value+/-error form:
+    columns = zip(*[token.partition('+/-') for token in tokens]) or [()]*3
+
+    try:
+        if all(columns[1]):
+            # Optimization: when all the numbers are of the
+            # value+/-error form (the most common case), they are
+            # converted without any Python loop:
+            return zip(map(float, columns[0]), map(float, columns[2]))
+        else:
+            return [(float(value), float(error)) if separator
+                    else parse_error_in_parentheses(value)
+                    for (value, separator, error) in zip(*columns)]
+    except ValueError:
+        # The invalid representation is looked for, for an informative
+        # error message:
+        for token in tokens:
+            _str_to_number_with_uncert(token)
+        raise
+
+def ufloats_fromstr(representations, tag=None):
+    """
+    Returns the list of new random variables (Variable objects)
+    represented in representations (string, file object or sequence
+    of strings: see parse_numbers_with_uncert()).
+
+    The variables all receive the given tag.
+    """
+    return [Variable(value, error, tag)
+            for (value, error) in parse_numbers_with_uncert(representations)]
+
 def _ufloat_obsolete(representation, tag=None):
     '''
     Legacy version of ufloat(). Will eventually be removed.
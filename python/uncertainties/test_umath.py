@@ -293,6 +293,40 @@ def test_math_module():
             raise Exception('ValueError exception expected')
 
     
+def test_array_arguments():
+    "Functions applied to arrays"
+
+    try:
+        import numpy
+        from uncertainties import unumpy
+        from uncertainties.unumpy import dense
+    except ImportError:
+        return  # No arrays without NumPy
+
+    x = ufloat(0.2, 0.01)
+    arr = numpy.array([x, 2*x, 0.5])
+
+    # The results are the same as element by element:
+    for name in ('sin', 'sqrt', 'acos', 'asinh', 'exp', 'fabs'):
+        func = getattr(umath, name)
+        result = func(arr)
+        for (element, element_result) in zip(arr[:2], result):
+            assert test_uncertainties._ufloats_close(
+                func(element), element_result, 1e-12)
+    # Correlations are kept:
+    assert umath.log(arr)[1] - umath.log(2*x) == 0
+
+    # Arrays of floats and lists:
+    floats = numpy.arange(3.)
+    assert numpy.all(umath.cos(floats) == numpy.cos(floats))
+    assert umath.fabs(arr)[2] == 0.5
+    assert umath.cos([x])[0] == umath.cos(x)
+
+    # Dense arrays:
+    dense_arr = dense.from_uarray(arr)
+    assert isinstance(umath.sqrt(dense_arr), dense.DenseUArray)
+    assert umath.sqrt(dense_arr)[1] - umath.sqrt(2*x) == 0
+
 def test_hypot():
     '''
     Special cases where derivatives cannot be calculated:
@@ -16,6 +16,7 @@ import weakref
 import math
 import random
 import sys
+from StringIO import StringIO
 
 # 3rd-party modules
 # import nose.tools
@@ -335,6 +336,34 @@ def test_str_input():
         assert _numbers_close(num.std_dev, values[1])
         assert num.tag == 'test variable'
 
+    ## Bulk parsing:
+
+    (representations, values) = zip(*tests.items())
+
+    for source in [representations,  # Sequence
+                   ', '.join(representations),  # String
+                   StringIO('\n'.join(representations))]:  # File
+
+        nums = uncertainties.ufloats_fromstr(source, 'bulk')
+        assert len(nums) == len(values)
+        for (num, (nominal_value, std_dev)) in zip(nums, values):
+            assert _numbers_close(num.nominal_value, nominal_value)
+            assert _numbers_close(num.std_dev, std_dev)
+            assert num.tag == 'bulk'
+
+    # Spaces are allowed around +/-:
+    assert (uncertainties.parse_numbers_with_uncert('1.5 +/- 0.1\t2(1)')
+            == [(1.5, 0.1), (2, 1)])
+
+    # Each string of a sequence must be a single number:
+    for source in ['1.2 x', ['1 2'], '1,,2']:
+        try:
+            uncertainties.parse_numbers_with_uncert(source)
+        except ValueError:
+            pass
+        else:
+            raise Exception('ValueError should be raised for %r' % source)
+
 ###############################################################################
             
 # Test of correctness of the fixed (usually analytical) derivatives:
@@ -452,6 +481,21 @@ def test_pickling():
     (f_unpickled, x_unpickled2) = pickle.loads(pickle.dumps((f, x)))
     # Correlations must be preserved:
     assert f_unpickled - x_unpickled2 - x_unpickled2 == 0
+
+    # Results of long calculations are pickled with their derivatives,
+    # not with the (deep) graph of the calculation:
+    import cPickle
+    z = x
+    for _ in xrange(5000):
+        z = z*1.0001
+    for pickle_module in (pickle, cPickle):
+        for protocol in range(pickle.HIGHEST_PROTOCOL+1):
+            (z_unpickled, x_unpickled3) = pickle_module.loads(
+                pickle_module.dumps((z, x), protocol))
+            assert _numbers_close(z_unpickled.nominal_value,
+                                  z.nominal_value)
+            assert _numbers_close(z_unpickled.derivatives[x_unpickled3],
+                                  z.derivatives[x])
     
     ## Tests with subclasses:
 
@@ -492,7 +536,24 @@ def test_pickling():
     # We make sure that the data is still there and untouched:
     assert x_unpickled._nominal_value == 'in slots'
     assert x_unpickled.__dict__ == x.__dict__
-        
+
+def test_slots():
+    "Numbers with uncertainties do not carry a __dict__"
+
+    import pickle
+
+    x = ufloat(3, 0.14)
+    f = 2*x
+    for number in (x, f, x.std_dev, f.std_dev):
+        assert not hasattr(number, '__dict__')
+
+    # The standard deviation survives pickling, with all protocols:
+    for protocol in range(pickle.HIGHEST_PROTOCOL+1):
+        x_unpickled = pickle.loads(pickle.dumps(x, protocol))
+        assert x_unpickled.std_dev == 0.14
+        assert isinstance(x_unpickled.std_dev, uncertainties.CallableStdDev)
+
+
 def test_int_div():
     "Integer division"
     # We perform all operations on floats, because derivatives can
@@ -1225,7 +1286,41 @@ def test_wrap_with_kwargs():
         f_wrapped4(x, 3.14, z, t=3.14)
     except FunctionCalled:
         raise Exception('User-supplied derivative should *not* be called')
-    
+
+def test_wrap_cache():
+    "Memoization of the value and derivatives of wrapped functions"
+
+    calls = []
+    def f(x, y=1.):
+        calls.append((x, y))
+        return math.sin(x)*y
+
+    f_wrapped = uncertainties.wrap(f, cache_size=2)
+
+    x = ufloat(0.5, 0.1)
+    result = f_wrapped(x, y=2.)
+    assert len(calls) == 3  # Value, and numerical derivative wrt x
+    assert _ufloats_close(result, umath.sin(x)*2, tolerance=1e-5)
+
+    # Same nominal values, but a different variable:
+    x2 = ufloat(0.5, 0.2)
+    assert _ufloats_close(f_wrapped(x2, y=2.), umath.sin(x2)*2,
+                          tolerance=1e-5)
+    assert len(calls) == 3
+
+    # Float arguments (and constants) need no derivative:
+    f_wrapped(x, y=3.)
+    assert len(calls) == 6
+    f_wrapped(uncertainties.to_affine_scalar(0.1))
+    assert len(calls) == 7
+    # The least recently used arguments were forgotten:
+    f_wrapped(x, y=2.)
+    assert len(calls) == 10
+
+    # Unhashable arguments are not cached:
+    f_wrapped = uncertainties.wrap(lambda x, l: x*len(l), cache_size=2)
+    assert abs(f_wrapped(x, [1, 2]).derivatives[x] - 2) < 1e-6
+
 ###############################################################################
         
 def test_access_to_std_dev():
@@ -1241,7 +1336,72 @@ def test_access_to_std_dev():
     # std_dev for other objects:
     assert uncertainties.std_dev([]) == 0
     assert uncertainties.std_dev(None) == 0
-    
+
+def test_cached_std_dev():
+    "Cached standard deviation of AffineScalarFunc objects"
+
+    x = ufloat(1, 0.1)
+    y = 2*x
+    assert y.std_dev == 0.2
+    # The cached value is not affected by the creation of variables...
+    ufloat(2, 0.3)
+    assert y.std_dev == 0.2
+    # ... but it must follow the standard deviation of its variables:
+    x.std_dev = 1
+    assert y.std_dev == 2
+
+    # The cache is not pickled:
+    import pickle
+    (y_unpickled, x_unpickled) = pickle.loads(pickle.dumps((y, x)))
+    x_unpickled.std_dev = 0.5
+    assert y_unpickled.std_dev == 1
+
+def test_usum():
+    "Sum of many numbers with uncertainties"
+
+    x = ufloat(1, 0.1)
+    y = ufloat(2, 0.2)
+    values = [x, y, 3, x]
+    assert _ufloats_close(uncertainties.usum(values), sum(values))
+    assert uncertainties.usum(values).derivatives == {x: 2, y: 1}
+
+    # Floats only:
+    assert uncertainties.usum([1, 2.5]) == 3.5
+    assert uncertainties.usum([]) == 0
+
+    # Many independent variables:
+    variables = [ufloat(1, 0.01) for i in range(10000)]
+    total = uncertainties.usum(variables)
+    assert total.nominal_value == 10000
+    assert _numbers_close(total.std_dev, 1)
+
+def test_lazy_derivatives():
+    "Derivatives of long calculations"
+
+    # Intermediate results are not expanded:
+    x = ufloat(1, 0.1)
+    y = ufloat(2, 0.2)
+    z = x*y
+    t = z + x
+    assert not z._linear_part.expanded()
+    assert t.derivatives == {x: 3, y: 1}
+    assert not z._linear_part.expanded()
+
+    # Subexpressions shared many times are only expanded once (this
+    # would never finish otherwise):
+    t = x
+    for i in range(100):
+        t = t + t
+    assert t.derivatives[x] == 2**100
+
+    # Long chains of products do not hit the recursion limit:
+    variables = [ufloat(1, 0.01) for i in range(2*sys.getrecursionlimit())]
+    product = 1
+    for variable in variables:
+        product *= variable
+    assert len(product.derivatives) == len(variables)
+    assert _numbers_close(product.std_dev, 0.01*math.sqrt(len(variables)))
+
 ###############################################################################
 
 def test_covariances():
@@ -1673,3 +1833,25 @@ else:
             numpy.array(cov_mat),
             numpy.array(uncertainties.covariance_matrix([x2, y2, z2])))
 
+    def test_correlated_values_dense():
+        "Correlated values as a dense array, and reuse of diagonalizations"
+
+        x = ufloat(1, 0.1)
+        y = ufloat(2, 0.3)
+        z = -3*x+y
+        cov_mat = numpy.array(uncertainties.covariance_matrix([x, y, z]))
+
+        values = uncertainties.correlated_values([1, 2, -1], cov_mat,
+                                                 dense=True)
+        assert arrays_close(values.covariance_matrix(), cov_mat)
+        assert arrays_close(numpy.array([values[2]]),
+                            numpy.array([-3*values[0]+values[1]]))
+
+        # The diagonalization is reused, but the variables are new:
+        (x2, y2, z2) = uncertainties.correlated_values([1, 2, -1], cov_mat)
+        (x3, y3, z3) = uncertainties.correlated_values([1, 2, -1], cov_mat)
+        assert arrays_close(numpy.array([x2, y2, z2]),
+                            numpy.array([x3, y3, z3]))
+        assert not set(x2.derivatives) & set(x3.derivatives)
+        assert (x2 - x3).std_dev > 0
+
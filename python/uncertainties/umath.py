@@ -14,6 +14,10 @@ Examples:
   # The umath functions also work on regular Python floats:
   print sin(3)  # prints 0.141120008...  This is a Python float.
 
+  # Functions of a single variable that have a NumPy equivalent also
+  # work on arrays, element-wise, with NumPy doing the calculations:
+  print sin(unumpy.uarray([1, 2], [0.1, 0.2]))
+
 Importing all the functions from this module into the global namespace
 is possible.  This is encouraged when using a Python shell as a
 calculator.  Example:
@@ -40,7 +44,6 @@ from __future__ import division  # Many analytical derivatives depend on this
 # Standard modules
 import math
 import sys
-import itertools
 import functools
 import inspect
 
@@ -186,6 +189,42 @@ fixed_derivatives = {
     'tanh': [lambda x: 1-math.tanh(x)**2]
     }
 
+# Types of the arguments that the wrapped functions handle as scalars:
+_scalar_types = (AffineScalarFunc,) + uncertainties.FLOAT_LIKE_TYPES
+
+def _with_array_support(func, name):
+    """
+    Returns a version of the uncertainty-aware version func() of the
+    function 'name' from the math module that also accepts an array
+    as its single argument, if NumPy has an equivalent function.
+
+    Arrays can be NumPy arrays (or array-like objects) of numbers with
+    uncertainties or of floats, or unumpy.dense.DenseUArray
+    objects. The function and its derivative are then calculated for
+    all the elements at once, with NumPy (see
+    unumpy.core.ufunc_with_uncert()).
+    """
+
+    def func_with_array_support(*args, **kwargs):
+
+        # Scalars are handled by func() (this is the most common case):
+        if len(args) != 1 or kwargs or isinstance(args[0], _scalar_types):
+            return func(*args, **kwargs)
+
+        try:
+            # Imported here, as unumpy imports this module:
+            from uncertainties.unumpy import core, dense
+        except ImportError:  # No NumPy: there are no arrays
+            return func(*args)
+
+        numpy_name = dense.ufunc_name(name)
+        if numpy_name is None:
+            return func(*args)
+
+        return core.ufunc_with_uncert(numpy_name)(args[0])
+
+    return func_with_array_support
+
 # Many built-in functions in the math module are wrapped with a
 # version which is uncertainty aware:
 
@@ -212,7 +251,9 @@ for name in dir(math):
     func = getattr(math, name)
     
     setattr(this_module, name,
-            wraps(uncertainties.wrap(func, derivatives), func))
+            wraps(_with_array_support(uncertainties.wrap(func, derivatives),
+                                      name),
+                  func))
     
     many_scalars_to_scalar_funcs.append(name)
 
@@ -240,30 +281,11 @@ if sys.version_info[:2] >= (2, 6):
     non_std_wrapped_funcs.append('factorial')
 
 
-    # We wrap math.fsum
-
-    original_func = math.fsum  # For optimization purposes
-
-    # The function below exists so that temporary variables do not
-    # pollute the module namespace:
-    def wrapped_fsum():
-        """
-        Returns an uncertainty-aware version of math.fsum, which must
-        be contained in _original_func.
-        """
-
-        # The fsum function is flattened, in order to use the
-        # wrap() wrapper:
-
-        flat_fsum = lambda *args: original_func(args)
-
-        flat_fsum_wrap = uncertainties.wrap(
-            flat_fsum, itertools.repeat(lambda *args: 1))
-
-        return wraps(lambda arg_list: flat_fsum_wrap(*arg_list),
-                     original_func)
-
-    fsum = wrapped_fsum()
+    # The uncertainty-aware version of math.fsum is uncertainties.usum
+    # (wrapping math.fsum with wrap() would take a time quadratic in
+    # the number of terms, as each of the derivatives would be
+    # calculated with all the terms as arguments):
+    fsum = wraps(lambda iterable: uncertainties.usum(iterable), math.fsum)
     non_std_wrapped_funcs.append('fsum')
 
 ##########
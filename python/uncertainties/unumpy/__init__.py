@@ -58,6 +58,15 @@ functions are available in the documentation of uncertainties.umath.
 for arrays that contain numbers with uncertainties (see the
 documentation for this module).
 
+- The unumpy.dense module defines an alternative array type, which
+stores the nominal values and the derivatives with respect to the
+variables as arrays of floats, so that calculations are done with
+vectorized NumPy operations (see the documentation for this module).
+
+- The unumpy.columns module saves collections of numbers with
+uncertainties to files, and loads them back, with their correlations,
+as a few NumPy arrays (see the documentation for this module).
+
 This module requires the NumPy package.
 
 (c) 2009-2013 by Eric O. LEBIGOT (EOL) <eric.lebigot@normalesup.org>.
@@ -71,6 +80,8 @@ author."""
 from core import *
 from uncertainties.unumpy import core
 from uncertainties.unumpy import ulinalg  # Local sub-module
+from uncertainties.unumpy import dense  # Local sub-module
+from uncertainties.unumpy import columns  # Local sub-module
 
 from uncertainties import __author__
 
@@ -79,4 +90,6 @@ __all__ = core.__all__
 # "import numpy" makes numpy.linalg available.  This behavior is
 # copied here, for maximum compatibility:
 __all__.append('ulinalg')
+__all__.append('dense')
+__all__.append('columns')
 
@@ -0,0 +1,197 @@
+"""
+Columnar storage of collections of numbers with uncertainties.
+
+Pickling numbers with uncertainties stores each of them as a Python
+object, along with the graph of Variable objects that it depends on;
+loading them back rebuilds this graph one object at a time.
+
+This module instead describes a collection of numbers with
+uncertainties (a list, an array, etc.) with a few flat NumPy arrays
+(columns):
+
+- the nominal values of the numbers,
+
+- a table of the independent variables (uncertainties.Variable
+  objects) that they depend on: nominal values, standard deviations
+  and tags, each variable being identified by its index in the table,
+
+- the non-zero derivatives of the numbers with respect to the
+  variables, as sparse (number index, variable index, derivative)
+  triplets.
+
+Correlations between the numbers are therefore preserved:
+
+  x = ufloat(1, 0.1, 'x')
+  columns.save('results.npz', [x, 2*x])
+  (x2, y2) = columns.load('results.npz')
+  print y2 - 2*x2  # 0.0+/-0
+
+Each load() creates new variables, which are shared by all the loaded
+numbers, but are independent of the variables of other loads.
+
+Tags are saved as strings.
+
+This module requires the NumPy package.
+"""
+
+from __future__ import division
+
+# 3rd-party modules:
+import numpy
+
+# Local modules:
+import uncertainties
+
+from uncertainties import __author__
+
+__all__ = ['to_columns', 'from_columns', 'save', 'load']
+
+def to_columns(values):
+    """
+    Returns a dictionary of NumPy arrays (columns) that describes the
+    given numbers with uncertainties, with their correlations.
+
+    values -- array or (nested) sequence of numbers with uncertainties
+    and floats.
+
+    The columns are:
+
+    shape -- shape of the array of values.
+
+    nominal_values -- nominal value of each number.
+
+    with_uncertainty -- True for numbers with uncertainty (False for
+    floats).
+
+    variable_of_value -- index of the variable that each number is
+    (for uncertainties.Variable objects), or -1.
+
+    variable_nominal_values, variable_std_devs, variable_tags,
+    variable_tagged -- table of the variables: nominal values,
+    standard deviations, tags as strings, and whether they have a tag
+    at all.
+
+    rows, columns, derivatives -- sparse Jacobian of the numbers with
+    respect to the variables: derivatives[k] is the derivative of the
+    number rows[k] with respect to the variable columns[k]. rows is
+    sorted.
+    """
+
+    values = numpy.asarray(values, dtype=object)
+
+    # {variable: index}:
+    variable_indices = {}
+
+    (nominal_values, with_uncertainty, variable_of_value) = ([], [], [])
+    (rows, columns, derivatives) = ([], [], [])
+
+    for (row, value) in enumerate(values.flat):
+
+        if not isinstance(value, uncertainties.AffineScalarFunc):
+            nominal_values.append(value)
+            with_uncertainty.append(False)
+            variable_of_value.append(-1)
+            continue
+
+        nominal_values.append(value.nominal_value)
+        with_uncertainty.append(True)
+
+        for (variable, derivative) in value.derivatives.iteritems():
+            rows.append(row)
+            columns.append(
+                variable_indices.setdefault(variable, len(variable_indices)))
+            derivatives.append(derivative)
+
+        variable_of_value.append(
+            variable_indices.setdefault(value, len(variable_indices))
+            if isinstance(value, uncertainties.Variable) else -1)
+
+    # Variables, in the order of their index:
+    variables = sorted(variable_indices, key=variable_indices.get)
+
+    return {
+        'shape': numpy.array(values.shape, dtype=int),
+        'nominal_values': numpy.array(nominal_values, dtype=float),
+        'with_uncertainty': numpy.array(with_uncertainty, dtype=bool),
+        'variable_of_value': numpy.array(variable_of_value, dtype=int),
+        'variable_nominal_values': numpy.array(
+            [variable.nominal_value for variable in variables], dtype=float),
+        'variable_std_devs': numpy.array(
+            [variable.std_dev for variable in variables], dtype=float),
+        'variable_tags': numpy.array(
+            ['' if variable.tag is None else str(variable.tag)
+             for variable in variables], dtype=str),
+        'variable_tagged': numpy.array(
+            [variable.tag is not None for variable in variables],
+            dtype=bool),
+        'rows': numpy.array(rows, dtype=int),
+        'columns': numpy.array(columns, dtype=int),
+        'derivatives': numpy.array(derivatives, dtype=float)
+        }
+
+def from_columns(columns):
+    """
+    Returns the NumPy array of numbers with uncertainties described by
+    the given columns, as returned by to_columns().
+
+    New variables are created, which are shared by all the returned
+    numbers.
+    """
+
+    variables = [
+        uncertainties.Variable(value, std_dev, tag if tagged else None)
+        for (value, std_dev, tag, tagged) in zip(
+            columns['variable_nominal_values'].tolist(),
+            columns['variable_std_devs'].tolist(),
+            columns['variable_tags'].tolist(),
+            columns['variable_tagged'].tolist())]
+
+    nominal_values = columns['nominal_values'].tolist()
+    rows = columns['rows']
+
+    # Derivatives of the number of index i in
+    # derivatives[bounds[i]:bounds[i+1]] (rows is sorted):
+    bounds = numpy.searchsorted(
+        rows, numpy.arange(len(nominal_values)+1)).tolist()
+    derivative_variables = [
+        variables[index] for index in columns['columns'].tolist()]
+    derivatives = columns['derivatives'].tolist()
+
+    values = []
+    for (index, (nominal_value, with_uncertainty, variable_index)) in (
+        enumerate(zip(nominal_values, columns['with_uncertainty'].tolist(),
+                      columns['variable_of_value'].tolist()))):
+
+        if variable_index >= 0:
+            values.append(variables[variable_index])
+        elif with_uncertainty:
+            (start, end) = bounds[index:index+2]
+            values.append(uncertainties.AffineScalarFunc(
+                nominal_value,
+                dict(zip(derivative_variables[start:end],
+                         derivatives[start:end]))))
+        else:
+            values.append(nominal_value)
+
+    result = numpy.empty(len(values), dtype=object)
+    result[:] = values
+    return result.reshape(tuple(columns['shape'].tolist()))
+
+def save(file, values):
+    """
+    Saves the given numbers with uncertainties (see to_columns()) to
+    file (file name or file object), in NumPy's compressed .npz
+    format.
+    """
+    numpy.savez_compressed(file, **to_columns(values))
+
+def load(file):
+    """
+    Returns the array of numbers with uncertainties saved in the given
+    file by save().
+    """
+    columns = numpy.load(file)
+    try:
+        return from_columns(columns)
+    finally:
+        columns.close()
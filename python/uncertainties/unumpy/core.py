@@ -21,15 +21,16 @@ from numpy.core import numeric
 # Local modules:
 import uncertainties
 from uncertainties import umath, deprecation
+from uncertainties.unumpy import dense
 
 from uncertainties import __author__
 
 __all__ = [
     # Factory functions:
-    'uarray', 'umatrix',
+    'uarray', 'uarray_fromstr', 'umatrix',
 
     # Utilities:
-    'nominal_values', 'std_devs',
+    'nominal_values', 'std_devs', 'usum',
 
     # Classes:
     'matrix'
@@ -103,6 +104,36 @@ def std_devs(arr):
 
     return unumpy_to_numpy_matrix(to_std_devs(arr))
 
+def usum(arr, axis=None):
+    """
+    Returns the sum of the numbers in NumPy array arr, over the given
+    axis, or over all elements if axis is None.
+
+    This is equivalent to arr.sum(axis), but each sum is calculated
+    with uncertainties.usum(), in a time proportional to the number of
+    terms (arr.sum() adds the elements one by one, and each partial
+    sum depends on the previous one).
+
+    Arrays that do not contain numbers with uncertainties (i.e. whose
+    dtype is not object) are summed directly by NumPy.
+    """
+
+    arr = numpy.asarray(arr)
+
+    if arr.dtype != object:
+        return arr.sum(axis)
+
+    if axis is None:
+        return uncertainties.usum(arr.flat)
+
+    # The summed axis is moved last, and each remaining element of the
+    # result is the sum of a 1D slice:
+    summed = numpy.rollaxis(arr, axis, arr.ndim)
+    result = numpy.empty(summed.shape[:-1], dtype=object)
+    for index in numpy.ndindex(result.shape):
+        result[index] = uncertainties.usum(summed[index])
+    return result
+
 ###############################################################################
 
 def derivative(u, var):
@@ -260,6 +291,21 @@ def uarray(nominal_values, std_devs=None):
         lambda v, s: uncertainties.Variable(v, s), otypes=[object])
         (nominal_values, std_devs))
 
+def uarray_fromstr(representations):
+    """
+    Returns a one-dimensional NumPy array of numbers with
+    uncertainties from their string representations (string, file
+    object or sequence of strings: see
+    uncertainties.parse_numbers_with_uncert()).
+
+    Each number is a new independent variable.
+    """
+    pairs = uncertainties.parse_numbers_with_uncert(representations)
+    result = numpy.empty(len(pairs), dtype=object)
+    result[:] = [uncertainties.Variable(value, error)
+                 for (value, error) in pairs]
+    return result
+
 ###############################################################################
 
 def array_derivative(array_like, var):
@@ -575,6 +621,79 @@ def umatrix(nominal_values, std_devs=None):
 
 ###############################################################################
 
+def check_domain(args, values):
+    """
+    Raises ValueError if some of the values of a function are not
+    finite while its arguments args are, as the math module does.
+    """
+    if not numpy.all(numpy.isfinite(values) | ~numpy.isfinite(args)):
+        raise ValueError('math domain error')
+
+def ufunc_with_uncert(name):
+    """
+    Returns a version of the NumPy function with the given name that
+    works with arrays of numbers with uncertainties.
+
+    The function and its derivative are taken from
+    unumpy.dense.ufunc_derivatives: they are calculated for all the
+    elements at once, with NumPy, and each element of the result only
+    has to be assembled from its value and derivative. As with the
+    functions of the math module, ValueError is raised if the function
+    is not finite at a finite value (e.g. sqrt(-1)).
+
+    The returned function accepts arrays of numbers with
+    uncertainties, arrays of floats (the NumPy function is applied),
+    and dense.DenseUArray objects (the dense version of the function
+    is applied).
+    """
+
+    (ufunc, derivative) = dense.ufunc_derivatives[name]
+    dense_func = getattr(dense, name)
+
+    # Optimization: no attribute look-up in the loop below:
+    AffineScalarFunc = uncertainties.AffineScalarFunc
+    LinearCombination = uncertainties.LinearCombination
+
+    def func_with_uncert(arr):
+        if isinstance(arr, dense.DenseUArray):
+            return dense_func(arr)
+
+        arr = numpy.asanyarray(arr)
+        if arr.dtype != object:
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                values = ufunc(arr)
+            check_domain(arr, values)
+            return values
+
+        # Working with lists is much faster than with NumPy iterators:
+        elements = list(arr.flat)
+        nominal_values = numpy.array(
+            [element._nominal_value if isinstance(element, AffineScalarFunc)
+             else element for element in elements], float)
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            values = ufunc(nominal_values)
+            derivatives = numpy.broadcast_to(derivative(nominal_values),
+                                             values.shape)
+        check_domain(nominal_values, values)
+
+        result = numpy.empty(len(elements), dtype=object)
+        result[:] = [
+            AffineScalarFunc(
+                value,
+                LinearCombination([(element_derivative,
+                                    element._linear_part)]))
+            if isinstance(element, AffineScalarFunc) else value
+            for (element, value, element_derivative) in zip(
+                elements, values.tolist(), derivatives.tolist())]
+
+        # The result keeps the type of arr (unumpy.matrix, etc.):
+        return result.reshape(arr.shape).view(type(arr))
+
+    func_with_uncert.__name__ = name
+
+    return func_with_uncert
+
 def define_vectorized_funcs():
     """
     Defines vectorized versions of functions from uncertainties.umath.
@@ -596,11 +715,26 @@ def define_vectorized_funcs():
     for (function_name, unumpy_name) in zip(
         umath.many_scalars_to_scalar_funcs, new_func_names):
 
+        func = getattr(umath, function_name)
+
+        # Functions with a NumPy equivalent are applied to all the
+        # elements at once:
+        if dense.ufunc_name(function_name) is not None:
+            vectorized_func = ufunc_with_uncert(
+                dense.ufunc_name(function_name))
+            vectorized_func.__doc__ = """\
+Vectorized version of umath.%s, which uses NumPy.
+
+Original documentation:
+%s""" % (function_name, func.__doc__)
+            setattr(this_module, unumpy_name, vectorized_func)
+            __all__.append(unumpy_name)
+            continue
+
         # ! The newly defined functions (uncertainties.unumpy.cos, etc.)
         # do not behave exactly like their NumPy equivalent (numpy.cos,
         # etc.): cos(0) gives an array() and not a
         # numpy.float... (equality tests succeed, though).
-        func = getattr(umath, function_name)
         setattr(
             this_module, unumpy_name,
             numpy.vectorize(func,
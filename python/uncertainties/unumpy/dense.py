@@ -0,0 +1,532 @@
+"""
+Arrays of numbers with uncertainties stored as dense NumPy arrays.
+
+A unumpy array (uarray) is a NumPy array of objects, each a number
+with uncertainty with its own dictionary of derivatives. Operations on
+such arrays are done element by element, in Python.
+
+A DenseUArray instead holds:
+
+- the nominal values, as a NumPy array of floats, and
+
+- the Jacobian of the values with respect to a list of independent
+  variables (uncertainties.Variable objects) that is shared by all the
+  elements. The Jacobian has the shape of the nominal values, plus one
+  last axis that runs over the variables.
+
+Arithmetic operations, mathematical functions (DenseUArray.sqrt(),
+etc.) and reductions are then done with vectorized NumPy operations,
+and the covariance matrix is the single product J diag(s**2) J^T,
+where s are the standard deviations of the variables.
+
+The Jacobian takes (number of elements) x (number of variables)
+floats: this representation suits arrays of a few thousand elements,
+such as efficiency tables, and not arrays of millions of independent
+measurements.
+
+  arr = dense.dense_uarray([1, 2], [0.1, 0.2])
+  print (arr*arr).std_devs  # [ 0.2  0.8]
+  print dense.sqrt(arr)[0]  # A regular number with uncertainty
+
+Since the variables are regular uncertainties.Variable objects,
+DenseUArray objects can be mixed with numbers with uncertainties, and
+converted from and to unumpy arrays, with correlations preserved.
+
+This module requires the NumPy package.
+"""
+
+from __future__ import division
+
+# 3rd-party modules:
+import numpy
+
+# Local modules:
+import uncertainties
+
+from uncertainties import __author__
+
+__all__ = [
+    # Class and factory functions:
+    'DenseUArray', 'dense_uarray', 'from_uarray',
+
+    # Mathematical functions (the list is completed below):
+    ]
+
+###############################################################################
+# Utilities
+
+def _align(arrays):
+    """
+    Returns the list of variables that the given DenseUArray objects
+    depend on, and the list of their Jacobians with respect to these
+    variables.
+    """
+
+    variables = arrays[0].variables
+    if all(arr.variables is variables for arr in arrays):
+        # Common case (all the arrays derive from the same one):
+        return (variables, [arr.jacobian for arr in arrays])
+
+    # The union of the variables is built (in order, so that arrays
+    # with the same variables keep their Jacobian):
+    indices = {}
+    variables = []
+    for arr in arrays:
+        for var in arr.variables:
+            if var not in indices:
+                indices[var] = len(variables)
+                variables.append(var)
+
+    jacobians = []
+    for arr in arrays:
+        jacobian = numpy.zeros(arr.nominal_values.shape + (len(variables),))
+        jacobian[..., [indices[var] for var in arr.variables]] = arr.jacobian
+        jacobians.append(jacobian)
+
+    return (variables, jacobians)
+
+def _to_dense(value):
+    """
+    Returns value as a DenseUArray, if it contains numbers with
+    uncertainties. Otherwise, returns it as an array of floats.
+    """
+
+    if isinstance(value, DenseUArray):
+        return value
+
+    if isinstance(value, uncertainties.AffineScalarFunc):
+        derivatives = value.derivatives
+        variables = list(derivatives)
+        return DenseUArray(
+            value.nominal_value,
+            numpy.array([derivatives[var] for var in variables], float),
+            variables)
+
+    value = numpy.asarray(value)
+    if value.dtype == object:
+        return from_uarray(value)
+
+    return value.astype(float)
+
+def _combine(nominal_values, terms):
+    """
+    Returns the DenseUArray with the given nominal values and with the
+    Jacobian given by the chain rule (or a number with uncertainty, if
+    the nominal values are a scalar).
+
+    terms -- list of (derivative, DenseUArray) pairs, where derivative
+    is the array of the derivatives of the result with respect to the
+    DenseUArray.
+    """
+
+    (variables, jacobians) = _align([arr for (_, arr) in terms])
+
+    jacobian = numpy.zeros(numpy.shape(nominal_values) + (len(variables),))
+    for ((derivative, _), arr_jacobian) in zip(terms, jacobians):
+        jacobian += numpy.asarray(derivative)[..., numpy.newaxis]*arr_jacobian
+
+    result = DenseUArray(nominal_values, jacobian, variables)
+    # Scalar results are numbers with uncertainties:
+    return result[()] if result.ndim == 0 else result
+
+def _unary_function(func, derivative):
+    """
+    Returns a function that applies func() (a NumPy function) to a
+    DenseUArray (or to anything that _to_dense() accepts), with the
+    given derivative (a function of the nominal values).
+
+    Arguments without uncertainties are simply passed to func().
+    """
+
+    def dense_func(x):
+        x = _to_dense(x)
+        if not isinstance(x, DenseUArray):
+            return func(x)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            return _combine(func(x.nominal_values),
+                            [(derivative(x.nominal_values), x)])
+
+    dense_func.__name__ = func.__name__
+
+    return dense_func
+
+def _binary_function(func, derivative_x, derivative_y):
+    """
+    Returns a function of two arguments that applies func() (a NumPy
+    function) to DenseUArray objects (or to anything that _to_dense()
+    accepts).
+
+    derivative_x, derivative_y -- derivatives of func() with respect to
+    its first and second arguments, as functions of the nominal values
+    of both arguments. They are only calculated for the arguments that
+    have an uncertainty.
+    """
+
+    def dense_func(x, y):
+        (x, y) = (_to_dense(x), _to_dense(y))
+        x_dense = isinstance(x, DenseUArray)
+        y_dense = isinstance(y, DenseUArray)
+        x_values = x.nominal_values if x_dense else x
+        y_values = y.nominal_values if y_dense else y
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            nominal_values = func(x_values, y_values)
+            terms = []
+            if x_dense:
+                terms.append((derivative_x(x_values, y_values), x))
+            if y_dense:
+                terms.append((derivative_y(x_values, y_values), y))
+
+        if not terms:
+            return nominal_values
+
+        # The derivatives are broadcast to the shape of the result:
+        terms = [(numpy.broadcast_to(derivative, nominal_values.shape), arr)
+                 for (derivative, arr) in terms]
+
+        return _combine(nominal_values, terms)
+
+    dense_func.__name__ = func.__name__
+
+    return dense_func
+
+def _pow_derivative_y(x, y):
+    """
+    Derivative of x**y with respect to y, which is taken to be 0 when x
+    is 0 and y is positive (as for numbers with uncertainties).
+    """
+    x = numpy.asarray(x, float)
+    return numpy.where((x == 0) & (y > 0), 0., numpy.log(x)*x**y)
+
+# Arithmetic operations, with their derivatives with respect to both
+# arguments:
+_add = _binary_function(numpy.add, lambda x, y: 1., lambda x, y: 1.)
+_subtract = _binary_function(
+    numpy.subtract, lambda x, y: 1., lambda x, y: -1.)
+_multiply = _binary_function(
+    numpy.multiply, lambda x, y: y, lambda x, y: x)
+_divide = _binary_function(
+    numpy.true_divide, lambda x, y: 1/y, lambda x, y: -x/y**2)
+_power = _binary_function(
+    numpy.power, lambda x, y: y*x**(y-1), _pow_derivative_y)
+
+def _reflected(func):
+    """
+    Returns the version of the binary function func() with its
+    arguments swapped.
+    """
+    return lambda self, other: func(other, self)
+
+###############################################################################
+
+class DenseUArray(object):
+    """
+    Array of numbers with uncertainties, stored as an array of nominal
+    values and a Jacobian with respect to a list of independent
+    variables.
+
+    Main attributes:
+
+    - nominal_values: NumPy array of floats.
+
+    - jacobian: NumPy array of floats, of shape nominal_values.shape +
+      (len(variables),). jacobian[..., i] is the derivative of the
+      array with respect to variables[i].
+
+    - variables: list of the uncertainties.Variable objects that the
+      array depends on. It is shared (and not copied) by the results of
+      operations on a single array, and must not be modified.
+
+    - std_devs: NumPy array of the standard deviations.
+
+    Elements and slices are obtained by indexing, like for NumPy
+    arrays. Single elements are returned as numbers with uncertainties
+    (AffineScalarFunc objects).
+    """
+
+    # NumPy operations with a DenseUArray on the right side use the
+    # reflected operators of this class:
+    __array_priority__ = 20
+    __array_ufunc__ = None
+
+    def __init__(self, nominal_values, jacobian, variables):
+        """
+        nominal_values -- array-like of floats.
+
+        jacobian -- array-like of floats, of the shape of
+        nominal_values, plus one last axis of length len(variables).
+
+        variables -- list of the uncertainties.Variable objects with
+        respect to which the Jacobian is given.
+        """
+        self.nominal_values = numpy.asarray(nominal_values, float)
+        self.jacobian = numpy.asarray(jacobian, float)
+        self.variables = variables
+
+    @property
+    def shape(self):
+        "Shape of the array."
+        return self.nominal_values.shape
+
+    @property
+    def ndim(self):
+        "Number of dimensions of the array."
+        return self.nominal_values.ndim
+
+    @property
+    def size(self):
+        "Number of elements of the array."
+        return self.nominal_values.size
+
+    def __len__(self):
+        return len(self.nominal_values)
+
+    def _variances(self):
+        """
+        Returns the array of the variances of the variables.
+        """
+        return numpy.array([var._std_dev for var in self.variables],
+                           float)**2
+
+    @property
+    def std_devs(self):
+        "NumPy array of the standard deviations of the elements."
+        return numpy.sqrt(
+            numpy.dot(self.jacobian**2, self._variances()))
+
+    def covariance_matrix(self):
+        """
+        Returns the covariance matrix of the elements of the array,
+        flattened, as a square NumPy array.
+        """
+        jacobian = self.jacobian.reshape(self.size, len(self.variables))
+        return numpy.dot(jacobian*self._variances(), jacobian.T)
+
+    def correlation_matrix(self):
+        """
+        Returns the correlation matrix of the elements of the array,
+        flattened, as a square NumPy array.
+        """
+        cov_mat = self.covariance_matrix()
+        std_devs = numpy.sqrt(cov_mat.diagonal())
+        return cov_mat/std_devs/std_devs[numpy.newaxis].T
+
+    def to_uarray(self):
+        """
+        Returns the array as a unumpy array of numbers with
+        uncertainties (NumPy array of objects).
+        """
+        result = numpy.empty(self.shape, dtype=object)
+        jacobian = self.jacobian.reshape(self.size, len(self.variables))
+        for (index, (value, derivatives)) in enumerate(
+            zip(self.nominal_values.flat, jacobian)):
+            result.flat[index] = uncertainties.AffineScalarFunc(
+                value,
+                dict((var, derivative)
+                     for (var, derivative) in zip(self.variables, derivatives)
+                     if derivative))
+        return result
+
+    def __getitem__(self, key):
+        nominal_values = self.nominal_values[key]
+        # The variables axis is kept whole:
+        if not isinstance(key, tuple):
+            key = (key,)
+        jacobian = self.jacobian[key + (slice(None),)]
+        if numpy.ndim(nominal_values) == 0:
+            return uncertainties.AffineScalarFunc(
+                nominal_values,
+                dict((var, derivative)
+                     for (var, derivative) in zip(self.variables, jacobian)
+                     if derivative))
+        return DenseUArray(nominal_values, jacobian, self.variables)
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+    def reshape(self, *shape):
+        """
+        Returns the array with a new shape (see numpy.ndarray.reshape).
+        """
+        nominal_values = self.nominal_values.reshape(*shape)
+        return DenseUArray(
+            nominal_values,
+            self.jacobian.reshape(
+                nominal_values.shape + (len(self.variables),)),
+            self.variables)
+
+    @property
+    def T(self):
+        "Transposed array."
+        axes = tuple(reversed(range(self.ndim))) + (self.ndim,)
+        return DenseUArray(self.nominal_values.T,
+                           self.jacobian.transpose(axes), self.variables)
+
+    def sum(self, axis=None):
+        """
+        Returns the sum of the elements over the given axis, or of all
+        the elements if axis is None.
+        """
+        if axis is None:
+            return self.reshape(-1).sum(0)
+        # The variables axis is not an axis of the array:
+        axis = axis % self.ndim
+        result = DenseUArray(self.nominal_values.sum(axis),
+                             self.jacobian.sum(axis), self.variables)
+        return result[()] if result.ndim == 0 else result
+
+    def mean(self, axis=None):
+        """
+        Returns the mean of the elements over the given axis, or of all
+        the elements if axis is None.
+        """
+        count = (self.size if axis is None
+                 else self.shape[axis % self.ndim])
+        return self.sum(axis)/count
+
+    def __repr__(self):
+        return "DenseUArray(%r, %r)" % (self.nominal_values, self.std_devs)
+
+    def __str__(self):
+        return str(self.to_uarray())
+
+    ## Operators:
+
+    __add__ = _add
+    __radd__ = _reflected(_add)
+    __sub__ = _subtract
+    __rsub__ = _reflected(_subtract)
+    __mul__ = _multiply
+    __rmul__ = _reflected(_multiply)
+    __div__ = __truediv__ = _divide
+    __rdiv__ = __rtruediv__ = _reflected(_divide)
+    __pow__ = _power
+    __rpow__ = _reflected(_power)
+
+    def __neg__(self):
+        return DenseUArray(-self.nominal_values, -self.jacobian,
+                           self.variables)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return absolute(self)
+
+###############################################################################
+# Factory functions
+
+def dense_uarray(nominal_values, std_devs, tag=None):
+    """
+    Returns a DenseUArray of independent numbers with uncertainties,
+    with the given nominal values and standard deviations.
+
+    nominal_values, std_devs -- valid arguments for numpy.array, with
+    identical shapes.
+
+    tag -- tag given to all the created variables.
+    """
+
+    nominal_values = numpy.asarray(nominal_values, float)
+    std_devs = numpy.broadcast_to(std_devs, nominal_values.shape)
+    variables = [uncertainties.Variable(value, std_dev, tag)
+                 for (value, std_dev) in zip(nominal_values.flat,
+                                             std_devs.flat)]
+    jacobian = numpy.eye(len(variables)).reshape(
+        nominal_values.shape + (len(variables),))
+
+    return DenseUArray(nominal_values, jacobian, variables)
+
+def from_uarray(arr):
+    """
+    Returns the DenseUArray equivalent to the given array-like of
+    numbers with uncertainties (unumpy array, list of numbers with
+    uncertainties, etc.), which can also contain floats.
+    """
+
+    arr = numpy.asarray(arr, dtype=object)
+
+    # All the variables involved:
+    indices = {}
+    variables = []
+    for element in arr.flat:
+        if isinstance(element, uncertainties.AffineScalarFunc):
+            for var in element.derivatives:
+                if var not in indices:
+                    indices[var] = len(variables)
+                    variables.append(var)
+
+    nominal_values = numpy.empty(arr.shape)
+    jacobian = numpy.zeros((arr.size, len(variables)))
+    for (index, element) in enumerate(arr.flat):
+        if isinstance(element, uncertainties.AffineScalarFunc):
+            nominal_values.flat[index] = element.nominal_value
+            for (var, derivative) in element.derivatives.iteritems():
+                jacobian[index, indices[var]] = derivative
+        else:
+            nominal_values.flat[index] = element
+
+    return DenseUArray(
+        nominal_values,
+        jacobian.reshape(arr.shape + (len(variables),)),
+        variables)
+
+###############################################################################
+# Mathematical functions
+
+# NumPy functions of one variable, with their derivative (as a
+# function of the variable):
+ufunc_derivatives = {
+    # As for umath.fabs, the derivative at 0 is taken to be 1:
+    'absolute': (numpy.absolute, lambda x: numpy.where(x >= 0, 1., -1.)),
+    'arccos': (numpy.arccos, lambda x: -1/numpy.sqrt(1-x**2)),
+    'arccosh': (numpy.arccosh, lambda x: 1/numpy.sqrt(x**2-1)),
+    'arcsin': (numpy.arcsin, lambda x: 1/numpy.sqrt(1-x**2)),
+    'arcsinh': (numpy.arcsinh, lambda x: 1/numpy.sqrt(1+x**2)),
+    'arctan': (numpy.arctan, lambda x: 1/(1+x**2)),
+    'arctanh': (numpy.arctanh, lambda x: 1/(1-x**2)),
+    'cos': (numpy.cos, lambda x: -numpy.sin(x)),
+    'cosh': (numpy.cosh, numpy.sinh),
+    'degrees': (numpy.degrees, lambda x: numpy.degrees(1.)),
+    'exp': (numpy.exp, numpy.exp),
+    'expm1': (numpy.expm1, numpy.exp),
+    'fabs': (numpy.fabs, lambda x: numpy.where(x >= 0, 1., -1.)),
+    'log': (numpy.log, lambda x: 1/x),
+    'log10': (numpy.log10, lambda x: 1/x/numpy.log(10)),
+    'log1p': (numpy.log1p, lambda x: 1/(1+x)),
+    'radians': (numpy.radians, lambda x: numpy.radians(1.)),
+    'sin': (numpy.sin, numpy.cos),
+    'sinh': (numpy.sinh, numpy.cosh),
+    'sqrt': (numpy.sqrt, lambda x: 0.5/numpy.sqrt(x)),
+    'tan': (numpy.tan, lambda x: 1+numpy.tan(x)**2),
+    'tanh': (numpy.tanh, lambda x: 1-numpy.tanh(x)**2),
+    }
+
+def ufunc_name(math_name):
+    """
+    Returns the name of the NumPy function equivalent to the function
+    math_name from the math module, if it is in ufunc_derivatives, and
+    None otherwise.
+    """
+    name = ('arc'+math_name[1:]
+            if math_name in ('acos', 'acosh', 'asin', 'asinh', 'atan',
+                             'atanh')
+            else math_name)
+    return name if name in ufunc_derivatives else None
+
+def _define_functions():
+    """
+    Defines the mathematical functions of this module, from
+    ufunc_derivatives.
+    """
+
+    namespace = globals()
+    for (name, (func, derivative)) in ufunc_derivatives.iteritems():
+        namespace[name] = _unary_function(func, derivative)
+        __all__.append(name)
+
+_define_functions()
+
+power = _power
+__all__.append('power')
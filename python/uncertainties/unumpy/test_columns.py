@@ -0,0 +1,79 @@
+"""
+Tests for uncertainties.unumpy.columns.
+
+These tests can be run through the Nose testing framework.
+"""
+
+from __future__ import division
+
+import tempfile
+import os
+
+try:
+    import numpy
+except ImportError:
+    import sys
+    sys.exit()  # There is no reason to test the interface to NumPy
+
+from uncertainties import ufloat, covariance_matrix, to_affine_scalar
+from uncertainties import Variable
+from uncertainties.unumpy import columns
+
+from uncertainties import __author__
+
+def same_covariances(values1, values2):
+    """
+    Returns True if the numbers with uncertainties (and floats) in the
+    two sequences have the same nominal values and covariance matrix.
+    """
+    (values1, values2) = ([to_affine_scalar(value) for value in values]
+                          for values in (values1, values2))
+    return (
+        [value.nominal_value for value in values1]
+        == [value.nominal_value for value in values2]
+        and numpy.allclose(covariance_matrix(values1),
+                           covariance_matrix(values2), rtol=1e-12, atol=0))
+
+def test_round_trip():
+    "Conversion to columns and back"
+
+    x = ufloat(1, 0.1, 'x')
+    y = ufloat(2, 0.2)
+    values = [x, 2*x + y, 3., y**2, to_affine_scalar(4)]
+
+    cols = columns.to_columns(values)
+    assert cols['rows'].tolist() == [0, 1, 1, 3]
+    assert len(cols['variable_std_devs']) == 2
+
+    loaded = columns.from_columns(cols)
+    assert loaded.shape == (5,)
+    assert same_covariances(loaded, values)
+
+    # Variables are restored as such, with their tag, and are shared:
+    assert isinstance(loaded[0], Variable) and loaded[0].tag == 'x'
+    [y_loaded] = loaded[3].derivatives.keys()
+    assert y_loaded.tag is None
+    assert set(loaded[1].derivatives) == set([loaded[0], y_loaded])
+    # Floats stay floats:
+    assert loaded[2] == 3 and isinstance(loaded[2], float)
+    assert loaded[4].std_dev == 0
+
+def test_save_load():
+    "Saving to and loading from files, for arrays"
+
+    arr = numpy.array([[ufloat(1, 0.1), 2.], [ufloat(3, 0.3), 4.]])
+    arr[1, 1] = arr[0, 0]*arr[1, 0]
+
+    (handle, path) = tempfile.mkstemp(suffix='.npz')
+    os.close(handle)
+    try:
+        columns.save(path, arr)
+        loaded = columns.load(path)
+    finally:
+        os.remove(path)
+
+    assert loaded.shape == (2, 2)
+    assert same_covariances(loaded.flat, arr.flat)
+
+    # Empty collections:
+    assert columns.from_columns(columns.to_columns([])).shape == (0,)
@@ -0,0 +1,111 @@
+"""
+Tests for uncertainties.unumpy.dense.
+
+These tests can be run through the Nose testing framework.
+"""
+
+from __future__ import division
+
+try:
+    import numpy
+except ImportError:
+    import sys
+    sys.exit()  # There is no reason to test the interface to NumPy
+
+from uncertainties import unumpy, ufloat, covariance_matrix, to_affine_scalar
+from uncertainties.unumpy import dense
+from uncertainties.unumpy.test_unumpy import arrays_close
+
+from uncertainties import __author__
+
+def dense_close(dense_arr, arr, precision=1e-10):
+    """
+    Returns True if the DenseUArray dense_arr and the array of numbers
+    with uncertainties arr have the same nominal values and covariance
+    matrix.
+    """
+    arr = numpy.asarray(arr, dtype=object)
+    return (
+        numpy.allclose(dense_arr.nominal_values, unumpy.nominal_values(arr),
+                       rtol=precision, atol=0)
+        and numpy.allclose(dense_arr.covariance_matrix(),
+                           covariance_matrix(map(to_affine_scalar, arr.flat)),
+                           rtol=precision, atol=precision))
+
+def test_creation_and_conversion():
+    "Creation of dense arrays, and conversion from and to unumpy arrays"
+
+    arr = dense.dense_uarray([[1, 2], [3, 4]], [[0.1, 0.2], [0.3, 0.4]])
+    assert arr.shape == (2, 2)
+    assert numpy.all(arr.std_devs == [[0.1, 0.2], [0.3, 0.4]])
+    assert numpy.all(arr.covariance_matrix()
+                     == numpy.diag([0.1, 0.2, 0.3, 0.4])**2)
+
+    # Elements are numbers with uncertainties:
+    x = arr[1, 0]
+    assert x.nominal_value == 3 and x.std_dev == 0.3
+    assert arr[1][0].derivatives == x.derivatives
+
+    # Round trip, with correlations and floats:
+    u = unumpy.uarray([1, 2], [0.1, 0.2])
+    u_arr = numpy.array([u[0], 2*u[0] + u[1], 3.], dtype=object)
+    converted = dense.from_uarray(u_arr)
+    assert dense_close(converted, u_arr)
+    assert arrays_close(converted.to_uarray(), u_arr)
+
+def test_operations():
+    "Arithmetic operations and functions"
+
+    u = unumpy.uarray([1, 2, 3], [0.1, 0.2, 0.3])
+    arr = dense.from_uarray(u)
+    x = ufloat(0.5, 0.05)
+
+    assert dense_close(arr + arr, u + u)
+    assert dense_close(arr - arr, u - u)
+    assert dense_close(arr*arr[::-1], u*u[::-1])
+    assert dense_close(arr/(arr + 1), u/(u + 1))
+    assert dense_close(arr**x, u**x)
+    assert dense_close(2**arr, 2**u)
+    assert dense_close(-abs(arr), -abs(u))
+
+    # Mixing with floats, arrays and numbers with uncertainties (on
+    # both sides):
+    assert dense_close(arr*x + 1, u*x + 1)
+    assert dense_close(x/arr, x/u)
+    assert dense_close(numpy.array([1., 2., 3.])*arr, [1., 2., 3.]*u)
+
+    # Broadcasting:
+    column = dense.from_uarray(u.reshape(3, 1))
+    assert dense_close(column*arr, u.reshape(3, 1)*u)
+
+    # Functions:
+    for name in ('sqrt', 'log', 'exp', 'cos', 'arctan', 'tanh'):
+        assert dense_close(getattr(dense, name)(arr),
+                           getattr(unumpy, name)(u))
+    assert dense_close(dense.arcsin(arr/4), unumpy.arcsin(u/4))
+
+def test_reductions():
+    "Sums and means"
+
+    u = unumpy.uarray([[1, 2, 3], [4, 5, 6]], [[0.1]*3, [0.2]*3])
+    arr = dense.from_uarray(u)
+
+    total = arr.sum()
+    assert abs(total.nominal_value - 21) < 1e-12
+    assert abs(total.std_dev - u.sum().std_dev) < 1e-12
+    for axis in (0, 1, -1):
+        assert dense_close(arr.sum(axis), u.sum(axis))
+    assert dense_close(arr.mean(1), u.mean(1))
+    assert dense_close(arr.T, u.T)
+    assert dense_close(arr.reshape(3, 2), u.reshape(3, 2))
+
+    # Correlations are kept:
+    assert (arr - arr).sum().std_dev == 0
+
+def test_std_dev_update():
+    "The standard deviations follow those of the variables"
+
+    arr = dense.dense_uarray([1, 2], [0.1, 0.2])
+    doubled = 2*arr
+    arr.variables[0].std_dev = 1
+    assert numpy.allclose(doubled.std_devs, [2, 0.4])
@@ -222,6 +222,28 @@ def test_broadcast_funcs():
 
     # Test of the __all__ variable:
     assert 'acos' not in unumpy.__all__
+
+    # Matrices stay matrices:
+    mat = unumpy.umatrix([[1, 2]], [[0.1, 0.2]])
+    assert isinstance(unumpy.exp(mat), unumpy.matrix)
+    # Functions without a NumPy equivalent are still available:
+    assert unumpy.gamma(arr)[1] == uncertainties.umath.gamma(arr[1])
+
+    # The derivative of fabs() at 0 is 1, as in umath:
+    zero = numpy.array([uncertainties.ufloat(0, 1)])
+    assert unumpy.fabs(zero)[0].std_dev == 1
+    assert unumpy.fabs(zero)[0].std_dev == uncertainties.umath.fabs(
+        zero[0]).std_dev
+
+    # Values outside of the domain of the function are errors, as in
+    # umath:
+    for values in (numpy.array([x, -x]), numpy.array([1., -1.])):
+        try:
+            unumpy.sqrt(values)
+        except ValueError:
+            pass
+        else:
+            raise Exception('ValueError should have been raised')
     
 def test_array_and_matrix_creation():
     "Test of custom array creation"
@@ -253,6 +275,30 @@ def test_component_extraction():
     assert type(unumpy.nominal_values(mat)) == numpy.matrix
     
 
+def test_usum():
+    "Sum of arrays of numbers with uncertainties"
+
+    arr = unumpy.uarray([[1, 2, 3], [4, 5, 6]], [[0.1]*3, [0.2]*3])
+
+    assert test_uncertainties._ufloats_close(unumpy.usum(arr), arr.sum())
+    for axis in (0, 1):
+        assert arrays_close(unumpy.usum(arr, axis), arr.sum(axis))
+
+    # Correlations are preserved:
+    assert unumpy.usum(arr - arr).std_dev == 0
+
+    # Arrays without uncertainties:
+    assert numpy.all(unumpy.usum(numpy.ones((2, 3)), 1) == [3, 3])
+
+def test_uarray_fromstr():
+    "Creation of arrays from string representations"
+
+    arr = unumpy.uarray_fromstr("1.5+/-0.1, 2.0(3)\n3")
+    assert arrays_close(arr, unumpy.uarray([1.5, 2, 3], [0.1, 0.3, 1]))
+    # The numbers are independent variables:
+    assert unumpy.usum(arr - arr[::-1]).std_dev == 0
+    assert (arr[0] - arr[1]).std_dev > arr[1].std_dev
+
 def test_array_comparisons():
     "Test of array and matrix comparisons"
 
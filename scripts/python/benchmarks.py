@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+
+"""
+benchmarks
+
+Timing and memory benchmarks of the analysis' hot spots.
+Each benchmark prints its results, and can be run on its own, e.g.
+    python benchmarks.py ufloat_memory
+Running the script without arguments runs all benchmarks.
+"""
+
+import gc
+import sys
+import time
+
+import numpy as np
+from uncertainties import ufloat, unumpy, covariance_matrix
+from uncertainties.unumpy import dense
+
+
+def best_time(f, repeats=5):
+    """Return the smallest wall-clock time, in seconds, of repeats calls."""
+    times = []
+    for i in range(repeats):
+        start = time.time()
+        f()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def ufloat_memory(n=100000):
+    """Memory use and allocation time of ufloats and their products.
+
+    Creating many ufloats, and combining them, is what the efficiency
+    chains do. The sizes are of the objects themselves; the derivatives
+    dictionary of each number is reported separately.
+    """
+    x = ufloat(0.9, 0.01)
+    f = x*x
+    print "Bytes per object:"
+    print "  Variable:           ", sys.getsizeof(x)
+    print "  AffineScalarFunc:   ", sys.getsizeof(f)
+    print "  std_dev:            ", sys.getsizeof(x.std_dev)
+    print "  Variable with std:  ", sys.getsizeof(x) + sys.getsizeof(x._std_dev)
+    print "  derivatives:        ", sys.getsizeof(x.derivatives)
+
+    # Garbage collection is disabled as the Variables are self-referencing
+    gc.disable()
+    try:
+        create = lambda: [ufloat(0.9, 0.01) for i in xrange(n)]
+        print "Time to create {0} ufloats: {1:.3f} s".format(
+            n, best_time(create)
+        )
+        variables = create()
+        multiply = lambda: [v*v for v in variables]
+        print "Time to square {0} ufloats: {1:.3f} s".format(
+            n, best_time(multiply)
+        )
+    finally:
+        gc.enable()
+
+
+def ufloat_chain(n=2000):
+    """Time to multiply n ufloats one at a time, and get the error.
+
+    This is what `total_efficiency *= eff` loops do.
+    """
+    variables = [ufloat(0.99, 0.001) for i in xrange(n)]
+
+    def chain():
+        product = 1
+        for v in variables:
+            product *= v
+        return product.std_dev
+
+    print "Time for a chain of {0} products: {1:.3f} s".format(
+        n, best_time(chain, repeats=3)
+    )
+
+
+def uarray_table(shape=(20, 20)):
+    """Error propagation over a 2D efficiency table.
+
+    The efficiency of each bin is the product of the table with a
+    correction, and the covariance matrix of the bins is calculated,
+    with unumpy object arrays and with dense arrays.
+    """
+    values = np.random.uniform(0.8, 1., shape)
+    errors = 0.01*values
+    correction = ufloat(0.98, 0.005)
+
+    def objects():
+        table = unumpy.uarray(values, errors)
+        effs = unumpy.sqrt(table*correction)
+        return covariance_matrix(list(effs.flat))
+
+    def vectorised():
+        table = dense.dense_uarray(values, errors)
+        effs = dense.sqrt(table*correction)
+        return effs.covariance_matrix()
+
+    print "Table of {0} bins, object array: {1:.3f} s".format(
+        values.size, best_time(objects, repeats=1)
+    )
+    print "Table of {0} bins, dense array:  {1:.3f} s".format(
+        values.size, best_time(vectorised, repeats=3)
+    )
+
+
+def umath_arrays(n=20000):
+    """Element-wise maths on an array of n ufloats, and on scalars."""
+    from uncertainties import umath
+    arr = unumpy.uarray(np.random.uniform(0.1, 1., n), 0.01)
+    print "umath.sqrt of {0} ufloats: {1:.3f} s".format(
+        n, best_time(lambda: umath.sqrt(arr), repeats=3)
+    )
+    print "Scalar umath.sqrt, {0} calls: {1:.3f} s".format(
+        n, best_time(lambda: [umath.sqrt(x) for x in arr], repeats=3)
+    )
+
+
+def ufloat_serialisation(n=2000):
+    """Size and time of saving and loading n correlated ufloats.
+
+    Compares pickling the numbers with the columnar format of
+    unumpy.columns.
+    """
+    import cPickle
+    from StringIO import StringIO
+    from uncertainties.unumpy import columns
+    variables = [ufloat(1., 0.1) for i in xrange(50)]
+    values = [variables[i % 50]*variables[(7*i) % 50] + i for i in xrange(n)]
+
+    print "Saving and loading {0} ufloats:".format(n)
+    pickled = cPickle.dumps(values, cPickle.HIGHEST_PROTOCOL)
+    print "  pickle:  {0} bytes, {1:.3f} s, {2:.3f} s".format(
+        len(pickled),
+        best_time(lambda: cPickle.dumps(values, cPickle.HIGHEST_PROTOCOL)),
+        best_time(lambda: cPickle.loads(pickled))
+    )
+
+    def save():
+        f = StringIO()
+        columns.save(f, values)
+        return f.getvalue()
+    saved = save()
+    print "  columns: {0} bytes, {1:.3f} s, {2:.3f} s".format(
+        len(saved), best_time(save),
+        best_time(lambda: columns.load(StringIO(saved)))
+    )
+
+def ufloat_parsing(n=10000):
+    """Time to parse n string representations of ufloats.
+
+    Compares ufloat_fromstr, called on each string, with the bulk
+    parsers, as used for efficiency tables read from text files.
+    """
+    import uncertainties
+    values = np.random.uniform(0.3, 0.5, n)
+    representations = [
+        "{0:.5f}+/-{1:.5f}".format(v, 1e-4) if i % 2
+        else "{0:.5f}({1})".format(v, 13)
+        for (i, v) in enumerate(values)
+    ]
+    text = "\n".join(representations)
+    print "Parsing {0} strings:".format(n)
+    print "  ufloat_fromstr:           {0:.3f} s".format(best_time(
+        lambda: [uncertainties.ufloat_fromstr(r) for r in representations]
+    ))
+    print "  parsing only, per string: {0:.3f} s".format(best_time(
+        lambda: [uncertainties._str_to_number_with_uncert(r)
+                 for r in representations]
+    ))
+    print "  parsing only, in bulk:    {0:.3f} s".format(best_time(
+        lambda: uncertainties.parse_numbers_with_uncert(text)
+    ))
+    print "  ufloats_fromstr:          {0:.3f} s".format(
+        best_time(lambda: uncertainties.ufloats_fromstr(text))
+    )
+    print "  unumpy.uarray_fromstr:    {0:.3f} s".format(
+        best_time(lambda: unumpy.uarray_fromstr(text))
+    )
+
+
+def import_times():
+    """Time to import each package and subpackage, in a fresh interpreter.
+
+    Also reports whether the import loaded ROOT, whose start-up dominates
+    the import time of the modules that need it.
+    """
+    import subprocess
+    modules = [
+        "uncertainties",
+        "uncertainties.unumpy",
+        "lc2pxx.config",
+        "lc2pxx.utilities",
+        "lc2pxx.scratch",
+        "lc2pxx.efficiencies.tables",
+        "lc2pxx.efficiencies.pid",
+        "lc2pxx.Ntuple",
+        "lc2pxx.ntuples",
+        "lc2pxx.fitting",
+        "lc2pxx.plotting"
+    ]
+    code = (
+        "import sys, time\n"
+        "start = time.time()\n"
+        "import {0}\n"
+        "print time.time() - start, 'ROOT' in sys.modules"
+    )
+    for module in modules:
+        process = subprocess.Popen(
+            [sys.executable, "-c", code.format(module)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        out, err = process.communicate()
+        if process.returncode:
+            print "  {0:28} failed: {1}".format(
+                module, err.strip().splitlines()[-1]
+            )
+            continue
+        seconds, root = out.split()
+        print "  {0:28} {1:.3f} s{2}".format(
+            module, float(seconds), ", loads ROOT" if root == "True" else ""
+        )
+
+
+benchmarks = [
+    ufloat_memory,
+    ufloat_chain,
+    uarray_table,
+    umath_arrays,
+    ufloat_serialisation,
+    ufloat_parsing,
+    import_times
+]
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or [b.__name__ for b in benchmarks]
+    for b in benchmarks:
+        if b.__name__ in names:
+            print "== {0} ==".format(b.__name__)
+            b()
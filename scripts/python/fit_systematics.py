@@ -33,6 +33,8 @@ def fit_systematics(mode, polarity, year):
     f = ROOT.TFile("{0}/fits/systematics-{1}.root".format(
         config.output_dir, n
     ), "recreate")
+    # Start each fit from the last converged parameters for its shapes
+    seeds = fitting.seeds.SeedStore(config.fit_seeds_path)
     # Try all combinations of signal and background shapes
     yields = {}
     for shape_sig in fitting.lambdac_mass.shapes_sig:
@@ -42,7 +44,7 @@ def fit_systematics(mode, polarity, year):
             ))
             # Unbinned fit
             fitting.lambdac_mass.fit(
-                sel_n, w, (shape_sig, shape_bkg), bins=0
+                sel_n, w, (shape_sig, shape_bkg), bins=0, seeds=seeds
             )
             yields[w.GetName()] = fitting.lambdac_mass.yields(w)
             c = plotting.plot_fit(
@@ -59,6 +61,7 @@ def fit_systematics(mode, polarity, year):
             w.Write()
             c.Write()
     f.Close()
+    seeds.save()
 
     nom_yield_sig, nom_yield_bkg = yields[nom_w_name]
     max_diff = -999